@@ -1,14 +1,15 @@
 import asyncio
 import logging
-import os
+import pathlib
 import random
+import sys
 from datetime import datetime
 from typing import Annotated
 
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))
+
 from agent_framework import ChatAgent
-from agent_framework.openai import OpenAIChatClient
-from azure.identity.aio import DefaultAzureCredential, get_bearer_token_provider
-from dotenv import load_dotenv
+from openai_clients import close_async_clients, get_chat_client
 from pydantic import Field
 from rich import print
 from rich.logging import RichHandler
@@ -20,32 +21,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 # Configure OpenAI client based on environment
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
-
-async_credential = None
-if API_HOST == "azure":
-    async_credential = DefaultAzureCredential()
-    token_provider = get_bearer_token_provider(async_credential, "https://cognitiveservices.azure.com/.default")
-    client = OpenAIChatClient(
-        base_url=f"{os.environ['AZURE_OPENAI_ENDPOINT']}/openai/v1/",
-        api_key=token_provider,
-        model_id=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
-    )
-elif API_HOST == "github":
-    client = OpenAIChatClient(
-        base_url="https://models.github.ai/inference",
-        api_key=os.environ["GITHUB_TOKEN"],
-        model_id=os.getenv("GITHUB_MODEL", "openai/gpt-4o"),
-    )
-elif API_HOST == "ollama":
-    client = OpenAIChatClient(
-        base_url=os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434/v1"),
-        api_key="none",
-        model_id=os.environ.get("OLLAMA_MODEL", "llama3.1:latest"),
-    )
-else:
-    client = OpenAIChatClient(api_key=os.environ["OPENAI_API_KEY"], model_id=os.environ.get("OPENAI_MODEL", "gpt-4o"))
+client = get_chat_client()
 
 # ----------------------------------------------------------------------------------
 # Sub-agent 1 tools: weekend planning
@@ -186,8 +162,7 @@ async def main():
     response = await supervisor_agent.run(user_query)
     print(response.text)
 
-    if async_credential:
-        await async_credential.close()
+    await close_async_clients()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,17 @@
 import os
+import pathlib
+import sys
+import time
 
-import azure.identity
-import openai
-from dotenv import load_dotenv
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-load_dotenv(override=True)
+from openai_clients import API_HOST, MODEL_NAME, get_client
+from stream_metrics import StreamMetrics
 
-API_HOST = os.getenv("API_HOST", "github")
+client = get_client()
+metrics = StreamMetrics(jsonl_path=os.getenv("STREAM_METRICS_FILE"))
 
-client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+start = time.perf_counter()
 
 response = client.chat.completions.create(
     model=MODEL_NAME,
@@ -19,13 +21,18 @@ response = client.chat.completions.create(
         {"role": "user", "content": "Write about a hungry cat who wants tuna"},
     ],
     stream=True,
+    # The last chunk then carries the token counts
+    stream_options={"include_usage": True},
 )
 
 print(f"Response from {API_HOST}: \n")
 # print(response.choices[0].message.content)
-for event in response:
+for event in metrics.measure(response, API_HOST, MODEL_NAME, start=start):
     if event.choices:
         content = event.choices[0].delta.content
         if content:
             print(content, end="", flush=True)
 
+print(f"\n\n{metrics.summary()}")
+if os.getenv("STREAM_METRICS_PROMETHEUS"):
+    metrics.write_prometheus(os.getenv("STREAM_METRICS_PROMETHEUS"))
@@ -1,36 +1,44 @@
 import os
+import pathlib
+import sys
+import time
 
-import azure.identity
-import openai
-from dotenv import load_dotenv
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-load_dotenv(override=True)
+from conversation_memory import ConversationMemory
+from openai_clients import API_HOST, MODEL_NAME, get_client
+from stream_metrics import StreamMetrics
+from stream_sinks import TerminalPrinter, TextBuffer, stream_to
 
-API_HOST = os.getenv("API_HOST", "github")
-client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-messages = [
-    {"role": "system", "content": "I am a large language model."},
-]
+client = get_client()
+# Only the most recent turns that fit in the budget are resent, older ones are folded into a summary
+memory = ConversationMemory(
+    client,
+    MODEL_NAME,
+    system_prompt="I am a large language model.",
+    max_tokens=int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "4000")),
+)
+metrics = StreamMetrics(jsonl_path=os.getenv("STREAM_METRICS_FILE"))
 
 while True:
     question = input("\nYour question: ")
     print("Sending question...")
 
-    messages.append({"role": "user", "content": question})
+    memory.add("user", question)
+    start = time.perf_counter()
     response = client.chat.completions.create(
         model=MODEL_NAME,
-        messages=messages,
+        messages=memory.messages(),
         temperature=0.7,
         stream=True,
+        stream_options={"include_usage": True},
     )
 
     print("\nAnswer: ")
-    bot_response = ""
-    for event in response:
-        if event.choices and event.choices[0].delta.content:
-            content = event.choices[0].delta.content
-            print(content, end="", flush=True)
-            bot_response += content
-    print("\n")
-    messages.append({"role": "assistant", "content": bot_response})
\ No newline at end of file
+    # One pass over the stream prints each delta and collects the answer for the history
+    bot_response = TextBuffer()
+    stream_to(metrics.measure(response, API_HOST, MODEL_NAME, start=start), TerminalPrinter(), bot_response)
+    print(f"\n[{metrics.summary()}]\n")
+    if os.getenv("STREAM_METRICS_PROMETHEUS"):
+        metrics.write_prometheus(os.getenv("STREAM_METRICS_PROMETHEUS"))
+    memory.add("assistant", bot_response.text())
\ No newline at end of file
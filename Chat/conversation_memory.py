@@ -0,0 +1,116 @@
+"""
+Conversation history kept within a token budget.
+
+The system prompt and the most recent turns are sent as they are. When they no longer fit
+in `max_tokens`, the oldest turns are taken out of the history and folded into a running
+summary of the conversation, which is sent along as a second system message. The summary
+is written by the model on a background thread, so the next question does not wait for it.
+"""
+
+import concurrent.futures
+
+import tiktoken
+
+# Every message costs a few tokens on top of its content for the role and separators
+TOKENS_PER_MESSAGE = 4
+SUMMARY_PROMPT = (
+    "You maintain a summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages, keep the facts, names, decisions and open questions "
+    "that later answers may need, and answer with the updated summary only."
+)
+
+
+def encoding_for(model):
+    """
+    Return the tiktoken encoding of a model, o200k_base (gpt-4o) for models tiktoken does not know.
+    """
+    try:
+        return tiktoken.encoding_for_model(model.split("/")[-1])
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class ConversationMemory:
+    def __init__(self, client, model, system_prompt, max_tokens=4000, summary_max_tokens=500):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.encoding = encoding_for(model)
+        self.summary = ""
+        # The turns as (message, tokens) pairs, oldest first
+        self.turns = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._summary_future = None
+        self._evicted = []
+
+    def count_tokens(self, content):
+        return len(self.encoding.encode(content)) + TOKENS_PER_MESSAGE
+
+    def add(self, role, content):
+        """
+        Append a turn, then move the oldest turns out of the history until it fits in the budget again.
+        """
+        self.turns.append(({"role": role, "content": content}, self.count_tokens(content)))
+        self._compact()
+
+    def total_tokens(self):
+        return self._fixed_tokens() + sum(tokens for _, tokens in self.turns)
+
+    def messages(self):
+        """
+        Return the messages to send: the system prompt, the summary of older turns if there is one,
+        then the recent turns.
+        """
+        self._collect_summary()
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        return messages + [message for message, _ in self.turns]
+
+    def _fixed_tokens(self):
+        tokens = self.count_tokens(self.system_prompt)
+        if self._summary_future is not None or self._evicted:
+            # Keep room for the summary being written, it arrives after the turns it replaces were dropped
+            return tokens + self.summary_max_tokens + TOKENS_PER_MESSAGE
+        return tokens + (self.count_tokens(self.summary) if self.summary else 0)
+
+    def _compact(self):
+        # The latest turn always stays, even when it is larger than the budget on its own
+        while len(self.turns) > 1 and self.total_tokens() > self.max_tokens:
+            message, _ = self.turns.pop(0)
+            self._evicted.append(message)
+        self._collect_summary()
+        if self._evicted and self._summary_future is None:
+            self._summary_future = self._executor.submit(self._summarize, self.summary, self._evicted)
+            self._evicted = []
+
+    def _collect_summary(self):
+        """
+        Take the summary from the background thread if it has finished, and start on turns evicted in the meantime.
+        """
+        if self._summary_future is None or not self._summary_future.done():
+            return
+        future, self._summary_future = self._summary_future, None
+        try:
+            self.summary = future.result()
+        except Exception as error:
+            # Keep the previous summary, the evicted turns are lost but the conversation goes on
+            print(f"\nCould not update the conversation summary: {error}")
+        if self._evicted:
+            self._summary_future = self._executor.submit(self._summarize, self.summary, self._evicted)
+            self._evicted = []
+
+    def _summarize(self, summary, messages):
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}"},
+            ],
+            temperature=0.3,
+            max_tokens=self.summary_max_tokens,
+        )
+        return response.choices[0].message.content.strip()
@@ -0,0 +1,151 @@
+"""
+Latency measurements of streamed chat completions, to compare API_HOST backends.
+
+StreamMetrics.measure wraps the chunk iterator returned by
+client.chat.completions.create(..., stream=True) and, once the stream is consumed,
+adds one record per request:
+    ttft_ms             time from sending the request to the first content chunk
+    gap_p50_ms ...      percentiles of the gaps between content chunks
+    completion_tokens   from the usage chunk (stream_options={"include_usage": True}),
+                        otherwise the number of content chunks
+    tokens_per_second   completion tokens after the first chunk over the time from the first to the last chunk
+
+The records can be appended to a JSON lines file, or exported as Prometheus text
+(summaries per api_host and model) for a node exporter textfile collector.
+"""
+
+import json
+import os
+import time
+
+GAP_PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile (0-100) of the values with linear interpolation, None when there are none.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class StreamMetrics:
+    def __init__(self, jsonl_path=None):
+        self.records = []
+        self.jsonl_path = jsonl_path
+
+    def measure(self, stream, api_host, model, start=None):
+        """
+        Yield the chunks of the stream unchanged while timing them, the record is added when the stream ends.
+        `start` is the perf_counter() value taken just before the request was sent.
+        """
+        start = time.perf_counter() if start is None else start
+        content_times = []
+        usage = None
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                content_times.append(time.perf_counter())
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            yield chunk
+        self.add(self.make_record(start, time.perf_counter(), content_times, usage, api_host, model))
+
+    def make_record(self, start, end, content_times, usage, api_host, model):
+        gaps = [1000 * (later - earlier) for earlier, later in zip(content_times, content_times[1:])]
+        completion_tokens = usage.completion_tokens if usage else len(content_times)
+        generation_seconds = content_times[-1] - content_times[0] if len(content_times) > 1 else 0
+        # The tokens of the first chunk arrived before the timed window starts, leave out their share
+        # (one chunk's worth, the usage chunk only gives the total)
+        generated_tokens = completion_tokens * (len(content_times) - 1) / len(content_times) if content_times else 0
+        record = {
+            "timestamp": time.time(),
+            "api_host": api_host,
+            "model": model,
+            "ttft_ms": 1000 * (content_times[0] - start) if content_times else None,
+            "total_ms": 1000 * (end - start),
+            "chunks": len(content_times),
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": completion_tokens,
+            "tokens_source": "usage" if usage else "chunks",
+            "tokens_per_second": generated_tokens / generation_seconds if generation_seconds else None,
+        }
+        for q in GAP_PERCENTILES:
+            record[f"gap_p{q}_ms"] = percentile(gaps, q)
+        record["gap_max_ms"] = max(gaps) if gaps else None
+        return record
+
+    def add(self, record):
+        self.records.append(record)
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    @property
+    def last(self):
+        return self.records[-1] if self.records else None
+
+    def summary(self, record=None):
+        """
+        Return a one-line description of a record (the last one by default).
+        """
+        record = record or self.last
+        if record is None:
+            return "No streams measured yet"
+
+        def ms(value):
+            return f"{value:.0f} ms" if value is not None else "-"
+
+        rate = f"{record['tokens_per_second']:.1f} tokens/s" if record["tokens_per_second"] else "- tokens/s"
+        return (
+            f"TTFT {ms(record['ttft_ms'])}, "
+            f"inter-chunk p50 {ms(record['gap_p50_ms'])} / p99 {ms(record['gap_p99_ms'])}, "
+            f"{record['completion_tokens']} tokens, {rate}, total {ms(record['total_ms'])}"
+        )
+
+    def prometheus_text(self):
+        """
+        Return the records as Prometheus text exposition format, one summary per metric and (api_host, model).
+        """
+        metrics = [
+            ("chat_stream_ttft_seconds", "Time from the request to the first streamed content chunk.", "ttft_ms"),
+            ("chat_stream_duration_seconds", "Time from the request to the end of the stream.", "total_ms"),
+            ("chat_stream_tokens_per_second", "Completion tokens per second while streaming.", "tokens_per_second"),
+        ]
+        groups = {}
+        for record in self.records:
+            groups.setdefault((record["api_host"], record["model"]), []).append(record)
+
+        lines = []
+        for name, help_text, field in metrics:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for (api_host, model), records in groups.items():
+                scale = 1000 if field.endswith("_ms") else 1
+                values = [record[field] / scale for record in records if record[field] is not None]
+                labels = f'api_host="{api_host}",model="{model}"'
+                for q in (0.5, 0.9, 0.99):
+                    value = percentile(values, 100 * q)
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {value if value is not None else "NaN"}')
+                lines.append(f"{name}_sum{{{labels}}} {sum(values)}")
+                lines.append(f"{name}_count{{{labels}}} {len(values)}")
+        lines += [
+            "# HELP chat_stream_completion_tokens_total Completion tokens streamed.",
+            "# TYPE chat_stream_completion_tokens_total counter",
+        ]
+        for (api_host, model), records in groups.items():
+            total = sum(record["completion_tokens"] for record in records)
+            lines.append(f'chat_stream_completion_tokens_total{{api_host="{api_host}",model="{model}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write the Prometheus text atomically, so a textfile collector never reads a half-written file.
+        """
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temporary_path, path)
@@ -0,0 +1,166 @@
+"""
+Consumers ("sinks") of the text of a streamed chat completion.
+
+The stream is read once and every content delta is handed to each sink in turn,
+so printing, collecting the answer and saving it are independent of each other.
+A sink has write(text) and close(), async sinks have async send(text) and aclose().
+
+    buffer = TextBuffer()
+    stream_to(response, TerminalPrinter(), buffer)
+    answer = buffer.text()
+
+For async streams, astream_to gives every sink its own bounded queue. When a sink
+falls behind (a slow websocket client), its queue fills up and the stream stops
+being read until there is room again, instead of buffering the whole answer in memory.
+"""
+
+import asyncio
+import io
+
+
+def content_deltas(stream):
+    """
+    Yield the text of every chunk that has content.
+    """
+    for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+
+
+async def acontent_deltas(stream):
+    async for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+
+
+class TextBuffer:
+    """
+    Collects the deltas in a StringIO, which grows in place instead of copying the whole answer on every `+=`.
+    """
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+
+    def write(self, text):
+        self._buffer.write(text)
+
+    def close(self):
+        pass
+
+    def text(self):
+        return self._buffer.getvalue()
+
+
+class TerminalPrinter:
+    def __init__(self, end="\n"):
+        self.end = end
+
+    def write(self, text):
+        print(text, end="", flush=True)
+
+    def close(self):
+        print(self.end, end="", flush=True)
+
+
+class FileSink:
+    """
+    Appends the deltas to a text file, opened on the first delta.
+    """
+
+    def __init__(self, path, mode="a", end="\n"):
+        self.path = path
+        self.mode = mode
+        self.end = end
+        self._file = None
+
+    def write(self, text):
+        if self._file is None:
+            self._file = open(self.path, self.mode, encoding="utf-8")
+        self._file.write(text)
+
+    def close(self):
+        if self._file is not None:
+            self._file.write(self.end)
+            self._file.close()
+            self._file = None
+
+
+class WebSocketSink:
+    """
+    Forwards the deltas to a websocket through its async send function
+    (websocket.send for websockets, websocket.send_text for Starlette/FastAPI).
+    """
+
+    def __init__(self, send, done_message=None):
+        self._send = send
+        self.done_message = done_message
+
+    async def send(self, text):
+        await self._send(text)
+
+    async def aclose(self):
+        if self.done_message is not None:
+            await self._send(self.done_message)
+
+
+def stream_to(stream, *sinks):
+    """
+    Read a chat completion stream once and write each delta to every sink, the sinks are closed at the end.
+    """
+    try:
+        for text in content_deltas(stream):
+            for sink in sinks:
+                sink.write(text)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+async def _drain(queue, sink):
+    while True:
+        text = await queue.get()
+        if text is None:
+            break
+        if hasattr(sink, "send"):
+            await sink.send(text)
+        else:
+            sink.write(text)
+    if hasattr(sink, "aclose"):
+        await sink.aclose()
+    else:
+        sink.close()
+
+
+async def _put(queue, consumer, text):
+    """
+    Put a delta in a sink's queue, waiting while it is full unless the sink fails meanwhile.
+    """
+    if not queue.full():
+        queue.put_nowait(text)
+        return
+    put = asyncio.ensure_future(queue.put(text))
+    await asyncio.wait([put, consumer], return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        # The sink stopped, raise its error instead of waiting for room that never comes
+        consumer.result()
+
+
+async def astream_to(stream, *sinks, max_pending=32):
+    """
+    Read an async chat completion stream once and feed every sink through its own queue of at
+    most `max_pending` deltas. Reading waits while any queue is full, so memory stays bounded
+    by the slowest sink instead of the length of the answer.
+    """
+    queues = [asyncio.Queue(maxsize=max_pending) for _ in sinks]
+    consumers = [asyncio.create_task(_drain(queue, sink)) for queue, sink in zip(queues, sinks)]
+    try:
+        async for text in acontent_deltas(stream):
+            for queue, consumer in zip(queues, consumers):
+                await _put(queue, consumer, text)
+        for queue, consumer in zip(queues, consumers):
+            await _put(queue, consumer, None)
+        await asyncio.gather(*consumers)
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
@@ -0,0 +1,198 @@
+"""
+Approximate nearest neighbour (HNSW) index over the ingested chunks.
+
+The index is saved next to the chunk store as two files:
+    rag_ingested_chunks.hnsw        the hnswlib graph
+    rag_ingested_chunks.hnsw.json   chunk id to label mapping and index parameters
+
+Build it and print a recall-vs-latency report against exhaustive search with:
+    python ann_index.py rag_ingested_chunks.emb --report
+"""
+
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import hnswlib
+import numpy as np
+from embedding_store import load_store
+from index_files import load_metadata, save_metadata
+from vector_index import ExactVectorIndex
+
+
+class HnswChunkIndex:
+    """
+    HNSW index addressed by chunk id instead of hnswlib's integer labels.
+    M and ef_construction are fixed once the index is built, ef can be
+    changed at any time to trade recall for latency.
+    """
+
+    def __init__(self, dim, M=16, ef_construction=200, ef=50, max_elements=1024):
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.labels_by_id = {}
+        self.ids_by_label = {}
+        self.next_label = 0
+        self.index = hnswlib.Index(space="cosine", dim=dim)
+        self.index.init_index(max_elements=max_elements, ef_construction=ef_construction, M=M)
+        self.set_ef(ef)
+
+    @classmethod
+    def build(cls, ids, vectors, M=16, ef_construction=200, ef=50):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ann_index = cls(vectors.shape[1], M=M, ef_construction=ef_construction, ef=ef, max_elements=max(len(ids), 1))
+        ann_index.upsert(ids, vectors)
+        return ann_index
+
+    def __len__(self):
+        return len(self.labels_by_id)
+
+    @property
+    def ef(self):
+        return self.index.ef
+
+    def set_ef(self, ef):
+        """
+        Set the size of the candidate list used at query time, higher means better recall but slower queries.
+        """
+        self.index.set_ef(ef)
+
+    def upsert(self, ids, vectors):
+        """
+        Insert new chunks, or replace the vectors of chunks already in the index.
+        """
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        labels = []
+        for chunk_id in ids:
+            if chunk_id not in self.labels_by_id:
+                self.labels_by_id[chunk_id] = self.next_label
+                self.ids_by_label[self.next_label] = chunk_id
+                self.next_label += 1
+            labels.append(self.labels_by_id[chunk_id])
+        # Deleted labels still take up space in hnswlib, so grow based on the highest label
+        if self.next_label > self.index.get_max_elements():
+            self.index.resize_index(max(self.next_label, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, labels)
+
+    def remove(self, ids):
+        """
+        Remove chunks from the index, they are marked deleted and skipped by searches.
+        """
+        for chunk_id in ids:
+            label = self.labels_by_id.pop(chunk_id, None)
+            if label is not None:
+                del self.ids_by_label[label]
+                self.index.mark_deleted(label)
+
+    def search(self, query_vector, limit):
+        """
+        Return the ids and cosine similarities of the approximately `limit` closest chunks, best first.
+        """
+        limit = min(limit, len(self))
+        if limit == 0:
+            return [], np.empty(0, dtype=np.float32)
+        labels, distances = self.index.knn_query(np.asarray(query_vector, dtype=np.float32), k=limit)
+        return [self.ids_by_label[label] for label in labels[0]], 1 - distances[0]
+
+    def save(self, path):
+        path = pathlib.Path(path)
+        self.index.save_index(str(path))
+        metadata = {
+            "space": "cosine",
+            "dim": self.dim,
+            "M": self.M,
+            "ef_construction": self.ef_construction,
+            "ef": self.ef,
+            "max_elements": self.index.get_max_elements(),
+            "next_label": self.next_label,
+            "labels": self.labels_by_id,
+        }
+        save_metadata(path, metadata)
+
+    @classmethod
+    def load(cls, path):
+        path = pathlib.Path(path)
+        metadata = load_metadata(path)
+        if metadata is None:
+            raise FileNotFoundError(f"{path} has no metadata file next to it")
+        ann_index = cls.__new__(cls)
+        ann_index.dim = metadata["dim"]
+        ann_index.M = metadata["M"]
+        ann_index.ef_construction = metadata["ef_construction"]
+        ann_index.labels_by_id = metadata["labels"]
+        ann_index.ids_by_label = {label: chunk_id for chunk_id, label in ann_index.labels_by_id.items()}
+        ann_index.next_label = metadata["next_label"]
+        ann_index.index = hnswlib.Index(space=metadata["space"], dim=metadata["dim"])
+        ann_index.index.load_index(str(path), max_elements=metadata["max_elements"])
+        ann_index.set_ef(metadata["ef"])
+        return ann_index
+
+
+def index_path(store_path):
+    """
+    Return the path of the HNSW index that belongs to a chunk store.
+    """
+    return pathlib.Path(store_path).with_suffix(".hnsw")
+
+
+def recall_latency_report(ann_index, exact_index, query_vectors, k=10, ef_values=(10, 20, 50, 100, 200)):
+    """
+    Measure recall@k against exhaustive search and the mean query latency for each ef value.
+    """
+    truths = [set(exact_index.search(query_vector, k)[0]) for query_vector in query_vectors]
+    original_ef = ann_index.ef
+    report = []
+    for ef in ef_values:
+        ann_index.set_ef(max(ef, k))
+        hits = 0
+        start = time.perf_counter()
+        results = [ann_index.search(query_vector, k)[0] for query_vector in query_vectors]
+        elapsed = time.perf_counter() - start
+        for result, truth in zip(results, truths):
+            hits += len(truth.intersection(result))
+        report.append(
+            {
+                "ef": ann_index.ef,
+                "recall": hits / max(sum(len(truth) for truth in truths), 1),
+                "latency_ms": 1000 * elapsed / max(len(query_vectors), 1),
+            }
+        )
+    ann_index.set_ef(original_ef)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the HNSW index for a chunk store")
+    parser.add_argument("store_path", nargs="?", default="rag_ingested_chunks.emb")
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", type=int, default=50)
+    parser.add_argument("--report", action="store_true", help="print recall and latency for a range of ef values")
+    parser.add_argument("--queries", type=int, default=100, help="number of stored vectors to use as report queries")
+    args = parser.parse_args()
+
+    store = load_store(args.store_path)
+    start = time.perf_counter()
+    ann_index = HnswChunkIndex.build(
+        store.ids, store.vectors, M=args.M, ef_construction=args.ef_construction, ef=args.ef
+    )
+    print(f"Built index of {len(ann_index)} chunks in {time.perf_counter() - start:.2f}s")
+    ann_index.save(index_path(args.store_path))
+
+    start = time.perf_counter()
+    ann_index = HnswChunkIndex.load(index_path(args.store_path))
+    print(f"Reloaded index in {1000 * (time.perf_counter() - start):.1f}ms")
+
+    if args.report:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(store), size=min(args.queries, len(store)), replace=False)
+        report = recall_latency_report(ann_index, ExactVectorIndex.from_store(store), store.vectors[rows])
+        print("ef\trecall@10\tlatency (ms)")
+        for row in report:
+            print(f"{row['ef']}\t{row['recall']:.3f}\t\t{row['latency_ms']:.3f}")
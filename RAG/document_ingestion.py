@@ -1,42 +1,183 @@
+import argparse
+import concurrent.futures
+import hashlib
 import json
 import os
 import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-import azure.identity
-import openai
 import pymupdf4llm
-from dotenv import load_dotenv
+import tiktoken
+from ann_index import HnswChunkIndex, index_path
+from embedding_store import save_store
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
+EMBEDDING_MODEL = "text-embedding-3-small"
+SPLITTER_SETTINGS = {"model_name": "gpt-4o", "chunk_size": 500, "chunk_overlap": 125}
+# Limits for a single embeddings request: the API accepts at most 2048 inputs
+# and 300k tokens per request, we stay well below both by default.
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+
+
+def batch_chunks(chunks, max_items=EMBEDDING_BATCH_MAX_ITEMS, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    """
+    Group chunks into batches that stay under both an item-count cap
+    and a token budget, so each batch fits in one embeddings request.
+    """
+    encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+    batch, batch_tokens = [], 0
+    for chunk in chunks:
+        num_tokens = len(encoding.encode(chunk["text"]))
+        if batch and (len(batch) >= max_items or batch_tokens + num_tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += num_tokens
+    if batch:
+        yield batch
+
+
+def embed_chunks(chunks):
+    """
+    Generate embeddings for the chunks with as few requests as possible,
+    and return them as a dict keyed by chunk id.
+    """
+    # Imported and created on first use: openai_clients reads the API key when it is imported,
+    # and the notebook and the PDF worker processes import this module without embedding anything
+    from openai_clients import get_client
+
+    client = get_client()
+    embeddings_by_id = {}
+    for batch in batch_chunks(chunks):
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=[chunk["text"] for chunk in batch])
+        # The response items carry the position of their input, map them back to the chunk ids
+        for item in response.data:
+            embeddings_by_id[batch[item.index]["id"]] = item.embedding
+    return embeddings_by_id
+
+
+def chunk_hash(text):
+    """
+    Hash a chunk's text together with the splitter and embedding settings,
+    so that changing any of them invalidates the stored embedding.
+    """
+    settings = json.dumps({"splitter": SPLITTER_SETTINGS, "embedding_model": EMBEDDING_MODEL}, sort_keys=True)
+    return hashlib.sha256(f"{settings}\n{text}".encode("utf-8")).hexdigest()
 
-if API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
-    
 
-data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
-filenames = ["California_carpenter_bee.pdf", "Centris_pallida.pdf", "Western_honey_bee.pdf", "Aphideater_hoverfly.pdf"]
-all_chunks = []
-for filename in filenames:
+def load_stored_chunks(path):
+    """
+    Load the chunks saved by a previous run, only keeping those that have a hash.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        stored_chunks = json.load(f)
+    return [chunk for chunk in stored_chunks if "hash" in chunk]
+
+
+def update_ann_index(path, chunks, changed_chunks, rebuild=False):
+    """
+    Bring the HNSW index saved next to the chunk store in line with the chunks:
+    chunks that are gone are removed, and new or changed chunks are inserted.
+    """
+    path = pathlib.Path(path)
+    ann_index = None
+    if not rebuild and path.exists():
+        ann_index = HnswChunkIndex.load(path)
+        # Vectors from a different embedding model can't be mixed into the existing index
+        if chunks and ann_index.dim != len(chunks[0]["embedding"]):
+            ann_index = None
+
+    if ann_index is None:
+        ann_index = HnswChunkIndex.build([chunk["id"] for chunk in chunks], [chunk["embedding"] for chunk in chunks])
+    else:
+        chunk_ids = {chunk["id"] for chunk in chunks}
+        ann_index.remove([chunk_id for chunk_id in ann_index.labels_by_id if chunk_id not in chunk_ids])
+        ann_index.upsert([chunk["id"] for chunk in changed_chunks], [chunk["embedding"] for chunk in changed_chunks])
+    ann_index.save(path)
+
+
+def parse_and_split(path):
+    """
+    Extract the text from one PDF file and split it into chunks.
+    Runs in a worker process, so it only takes and returns picklable values.
+    """
+    path = pathlib.Path(path)
     # Extract text from the PDF file
-    md_text = pymupdf4llm.to_markdown(data_dir / filename)
+    md_text = pymupdf4llm.to_markdown(path)
 
     # Split the text into smaller chunks
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4o", chunk_size=500, chunk_overlap=125
-    )
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(**SPLITTER_SETTINGS)
     texts = text_splitter.create_documents([md_text])
-    file_chunks = [{"id": f"{filename}-{(i + 1)}", "text": text.page_content} for i, text in enumerate(texts)]
-
-    # Generate embeddings using openAI SDK for each text
-    for file_chunk in file_chunks:
-        file_chunk["embedding"] = (
-            client.embeddings.create(model="text-embedding-3-small", input=file_chunk["text"]).data[0].embedding
-        )
-    all_chunks.extend(file_chunks)
-
-# Save the documents with embeddings to a JSON file
-with open("rag_ingested_chunks.json", "w") as f:
-    json.dump(all_chunks, f, indent=4)
\ No newline at end of file
+    return [{"id": f"{path.name}-{(i + 1)}", "text": text.page_content} for i, text in enumerate(texts)]
+
+
+def parse_and_split_files(paths, max_workers=None):
+    """
+    Parse and split the PDF files across a pool of processes.
+    Executor.map returns results in input order, so chunk ids and ordering
+    are the same as a serial run. max_workers defaults to the number of CPUs.
+    """
+    if max_workers == 1:
+        file_chunks = list(map(parse_and_split, paths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            file_chunks = list(executor.map(parse_and_split, paths))
+    return [chunk for chunks in file_chunks for chunk in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the PDFs into rag_ingested_chunks.json")
+    parser.add_argument("--full", action="store_true", help="re-embed every chunk instead of reusing stored embeddings")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="number of PDF parsing processes (default: CPU count)"
+    )
+    args = parser.parse_args()
+
+    output_path = "rag_ingested_chunks.json"
+    stored_chunks = [] if args.full else load_stored_chunks(output_path)
+    stored_embeddings = {chunk["hash"]: chunk["embedding"] for chunk in stored_chunks}
+    stored_hashes_by_id = {chunk["id"]: chunk["hash"] for chunk in stored_chunks}
+
+    # Every PDF in the data folder is ingested, adding or deleting a file there is picked up by the next run
+    data_dir = pathlib.Path(os.path.dirname(__file__)) / "data"
+    all_chunks = parse_and_split_files(sorted(data_dir.glob("*.pdf")), max_workers=args.workers)
+    # The hash covers EMBEDDING_MODEL, so it is only added here where the chunks get embedded with that model
+    for chunk in all_chunks:
+        chunk["hash"] = chunk_hash(chunk["text"])
+
+    # Reuse the stored embeddings of unchanged chunks, only new or changed chunks go to the API.
+    # Chunks of files deleted from the data folder are dropped since the output is rebuilt from all_chunks.
+    new_chunks = [chunk for chunk in all_chunks if chunk["hash"] not in stored_embeddings]
+    print(f"Reusing {len(all_chunks) - len(new_chunks)} stored embeddings, embedding {len(new_chunks)} chunks.")
+
+    # Generate embeddings using openAI SDK, batching many chunks into each request
+    embeddings_by_id = embed_chunks(new_chunks)
+    for chunk in all_chunks:
+        chunk["embedding"] = stored_embeddings.get(chunk["hash"]) or embeddings_by_id[chunk["id"]]
+
+    # Save the documents with embeddings to a JSON file
+    with open(output_path, "w") as f:
+        json.dump(all_chunks, f, indent=4)
+
+    # Also save them as a binary store, which readers can memory-map instead of parsing JSON floats
+    store_path = pathlib.Path(output_path).with_suffix(".emb")
+    save_store(
+        store_path,
+        [chunk["id"] for chunk in all_chunks],
+        [chunk["embedding"] for chunk in all_chunks],
+        columns={"text": [chunk["text"] for chunk in all_chunks], "hash": [chunk["hash"] for chunk in all_chunks]},
+    )
+
+    # Update the HNSW index next to the store, chunks keep their id but may get different text when a file changes
+    changed_chunks = [chunk for chunk in all_chunks if stored_hashes_by_id.get(chunk["id"]) != chunk["hash"]]
+    update_ann_index(index_path(store_path), all_chunks, changed_chunks, rebuild=args.full)
+
+
+# The guard keeps worker processes, which re-import this module, from running the ingestion
+if __name__ == "__main__":
+    main()
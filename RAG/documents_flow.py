@@ -1,23 +1,19 @@
 import json
-import os
+import pathlib
+import sys
 
-import azure.identity
-import openai
-from dotenv import load_dotenv
-from lunr import lunr
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
+from openai_clients import API_HOST, MODEL_NAME, get_client
+from text_index import load_or_build_index
 
-if API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+client = get_client()
 
 # Index the data from the JSON - each object has id, text, and embedding
 with open("rag_ingested_chunks.json") as file:
     documents = json.load(file)
     documents_by_id = {doc["id"]: doc for doc in documents}
-index = lunr(ref="id", fields=["text"], documents=documents)
+index = load_or_build_index("rag_ingested_chunks.json", ref="id", fields=["text"], documents=documents)
 
 # Get the user question
 user_question = "where do digger bees live?"
@@ -1,25 +1,54 @@
-import json
-import os
+import concurrent.futures
+import heapq
+import pathlib
+import sys
+import time
 
-import azure.identity
-import openai
-from dotenv import load_dotenv
-from lunr import lunr
-from sentence_transformers import CrossEncoder
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
+from ann_index import HnswChunkIndex, index_path
+from embedding_cache import EmbeddingCache
+from embedding_store import load_store
+from openai_clients import API_HOST, MODEL_NAME, get_client
+from reranker import Reranker
+from text_index import load_or_build_index
 
-if API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+client = get_client()
 
 
-# Index the data from the JSON - each object has id, text, and embedding
-with open("rag_ingested_chunks.json") as file:
-    documents = json.load(file)
-    documents_by_id = {doc["id"]: doc for doc in documents}
-index = lunr(ref="id", fields=["text"], documents=documents)
+STORE_PATH = pathlib.Path("rag_ingested_chunks.emb")
+if not STORE_PATH.exists():
+    sys.exit(f"{STORE_PATH} not found, run document_ingestion.py to ingest the PDFs first")
+
+# Index the data from the embedding store - each row has id, text, and embedding
+store = load_store(STORE_PATH)
+documents = store.documents()
+documents_by_id = {doc["id"]: doc for doc in documents}
+index = load_or_build_index(STORE_PATH, ref="id", fields=["text"], documents=documents)
+# The HNSW index is saved next to the store by document_ingestion.py (or `python ann_index.py`)
+if not index_path(STORE_PATH).exists():
+    sys.exit(f"{index_path(STORE_PATH)} not found, run document_ingestion.py to build it")
+vector_index = HnswChunkIndex.load(index_path(STORE_PATH))
+
+# Repeated queries reuse their embedding instead of calling the API again
+embedding_cache = EmbeddingCache(client, max_entries=1024, path="query_embeddings.sqlite")
+
+# Load the cross-encoder once, every query reuses it
+reranker = Reranker("cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32, max_candidates=20)
+
+# Runs the full-text and vector legs of hybrid_search side by side
+search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+
+def timed(timings, stage, function, *args, **kwargs):
+    """
+    Call the function and record how long it took, in milliseconds, under `stage`.
+    """
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        timings[stage] = 1000 * (time.perf_counter() - start)
 
 
 def full_text_search(query, limit):
@@ -34,41 +63,42 @@ def full_text_search(query, limit):
 def vector_search(query, limit):
     """
     Perform a vector search on the indexed documents
-    using a simple cosine similarity function.
+    using the approximate nearest neighbour (HNSW) index.
     """
-
-    def cosine_similarity(a, b):
-        return sum(x * y for x, y in zip(a, b)) / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5))
-
-    query_embedding = client.embeddings.create(model="text-embedding-3-small", input=query).data[0].embedding
-    similarities = []
-    for doc in documents:
-        doc_embedding = doc["embedding"]
-        similarity = cosine_similarity(query_embedding, doc_embedding)
-        similarities.append((doc, similarity))
-    similarities.sort(key=lambda x: x[1], reverse=True)
-
-    retrieved_documents = [doc for doc, _ in similarities[:limit]]
+    query_embedding = embedding_cache.embed(query, model="text-embedding-3-small")
+    # hnswlib does not check the dimension, it would quietly return meaningless neighbours
+    if len(query_embedding) != vector_index.dim:
+        raise ValueError(
+            f"The HNSW index holds {vector_index.dim}-dim vectors but the query embedding has {len(query_embedding)}, "
+            "run document_ingestion.py to embed the chunks with text-embedding-3-small"
+        )
+    doc_ids, _ = vector_index.search(query_embedding, limit)
+    retrieved_documents = [documents_by_id[doc_id] for doc_id in doc_ids]
     return retrieved_documents
 
 
-def reciprocal_rank_fusion(text_results, vector_results, k=60):
+def reciprocal_rank_fusion(*result_lists, weights=None, k=60, limit=None):
     """
-    Perform Reciprocal Rank Fusion (RRF) on the results from text and vector searches,
+    Perform Reciprocal Rank Fusion (RRF) on any number of ranked result lists,
     based on algorithm described here:
     https://learn.microsoft.com/azure/search/hybrid-search-ranking#how-rrf-ranking-works
+    Each list's contribution is scaled by its weight (default 1), and when a limit
+    is given only the top `limit` documents are selected, using a heap instead of a full sort.
     """
-    scores = {}
+    if weights is None:
+        weights = [1] * len(result_lists)
+    if len(weights) != len(result_lists):
+        raise ValueError(f"Got {len(weights)} weights for {len(result_lists)} result lists")
 
-    for i, doc in enumerate(text_results):
-        if doc["id"] not in scores:
-            scores[doc["id"]] = 0
-        scores[doc["id"]] += 1 / (i + k)
-    for i, doc in enumerate(vector_results):
-        if doc["id"] not in scores:
-            scores[doc["id"]] = 0
-        scores[doc["id"]] += 1 / (i + k)
-    scored_documents = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    scores = {}
+    for results, weight in zip(result_lists, weights):
+        for i, doc in enumerate(results):
+            scores[doc["id"]] = scores.get(doc["id"], 0) + weight / (i + k)
+
+    if limit is None:
+        scored_documents = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    else:
+        scored_documents = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
     retrieved_documents = [documents_by_id[doc_id] for doc_id, _ in scored_documents]
     return retrieved_documents
 
@@ -77,20 +107,27 @@ def rerank(query, retrieved_documents):
     """
     Rerank the results using a cross-encoder model.
     """
-    encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-    scores = encoder.predict([(query, doc["text"]) for doc in retrieved_documents])
-    scored_documents = [v for _, v in sorted(zip(scores, retrieved_documents), reverse=True)]
-    return scored_documents
+    return reranker.rerank(query, retrieved_documents)
 
 
-def hybrid_search(query, limit):
+def hybrid_search(query, limit, timings=None):
     """
     Perform a hybrid search using both full-text and vector search.
+    The full-text search runs while the vector search waits on the query embedding,
+    and the time spent in each stage is recorded in `timings` when a dict is passed.
     """
-    text_results = full_text_search(query, limit * 2)
-    vector_results = vector_search(query, limit * 2)
-    fused_results = reciprocal_rank_fusion(text_results, vector_results)
-    reranked_results = rerank(query, fused_results)
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    text_future = search_executor.submit(timed, timings, "full_text_search", full_text_search, query, limit * 2)
+    vector_future = search_executor.submit(timed, timings, "vector_search", vector_search, query, limit * 2)
+    text_results = text_future.result()
+    vector_results = vector_future.result()
+    # Only the candidates the reranker will look at need to come out of the fusion
+    fused_results = timed(
+        timings, "fusion", reciprocal_rank_fusion, text_results, vector_results, limit=reranker.max_candidates
+    )
+    reranked_results = timed(timings, "rerank", rerank, query, fused_results)
+    timings["total"] = 1000 * (time.perf_counter() - start)
     return reranked_results[:limit]
 
 
@@ -98,8 +135,10 @@ def hybrid_search(query, limit):
 user_question = "cute gray fuzzy bee"
 
 # Search the index for the user question
-retrieved_documents = hybrid_search(user_question, limit=5)
+timings = {}
+retrieved_documents = hybrid_search(user_question, limit=5, timings=timings)
 print(f"Retrieved {len(retrieved_documents)} matching documents.")
+print("Search timings: " + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items()))
 context = "\n".join([f"{doc['id']}: {doc['text']}" for doc in retrieved_documents[0:5]])
 
 # Now we can use the matches to generate a response
@@ -0,0 +1,160 @@
+"""
+Binary columnar storage for embeddings.
+
+A store is a single file holding the ids (plus optional text columns such as
+the chunk text) in a small JSON header, followed by all vectors as one
+contiguous row-major float32 (or float16) matrix. The matrix can be
+memory-mapped, so opening a store doesn't parse or copy any floats.
+
+File layout:
+    8 bytes   magic b"EMBSTORE"
+    8 bytes   header length, little-endian uint64
+    header    UTF-8 JSON: version, dtype, shape, ids, columns
+    padding   zero bytes up to a multiple of 64
+    matrix    shape[0] * shape[1] values of dtype
+
+Convert the existing JSON files with:
+    python embedding_store.py rag_ingested_chunks.json
+    python embedding_store.py ../VectorEmbedding/embeddings/words_text-embedding-3-small-1536.json --dtype float16
+"""
+
+import argparse
+import json
+import pathlib
+import struct
+
+import numpy as np
+
+MAGIC = b"EMBSTORE"
+VERSION = 1
+ALIGNMENT = 64
+DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+
+class EmbeddingStore:
+    """
+    Ids, optional text columns and the matching (n, dim) vector matrix.
+    """
+
+    def __init__(self, ids, vectors, columns=None):
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        self.ids = list(ids)
+        self.vectors = vectors
+        self.columns = dict(columns or {})
+        self._rows_by_id = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def row(self, id):
+        """
+        Return the row number of the given id.
+        """
+        if self._rows_by_id is None:
+            self._rows_by_id = {id: row for row, id in enumerate(self.ids)}
+        return self._rows_by_id[id]
+
+    def vector(self, id):
+        return self.vectors[self.row(id)]
+
+    def documents(self):
+        """
+        Return the rows as dicts, in the same shape as rag_ingested_chunks.json.
+        The embeddings are views into the matrix rather than lists of floats.
+        """
+        return [
+            {"id": id, **{name: values[row] for name, values in self.columns.items()}, "embedding": self.vectors[row]}
+            for row, id in enumerate(self.ids)
+        ]
+
+
+def save_store(path, ids, vectors, columns=None, dtype="float32"):
+    """
+    Write ids, text columns and vectors to a store file.
+    """
+    matrix = np.ascontiguousarray(vectors, dtype=DTYPES[dtype])
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise ValueError(f"Expected a ({len(ids)}, dim) matrix, got shape {matrix.shape}")
+    columns = {name: list(values) for name, values in (columns or {}).items()}
+    for name, values in columns.items():
+        if len(values) != len(ids):
+            raise ValueError(f"Column {name!r} has {len(values)} values for {len(ids)} ids")
+
+    header = json.dumps(
+        {"version": VERSION, "dtype": dtype, "shape": list(matrix.shape), "ids": list(ids), "columns": columns},
+        ensure_ascii=False,
+    ).encode("utf-8")
+    offset = len(MAGIC) + 8 + len(header)
+    padding = -offset % ALIGNMENT
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * padding)
+        f.write(matrix.tobytes())
+
+
+def load_store(path, mmap=True):
+    """
+    Open a store file. With mmap=True the vectors are a read-only
+    memory map of the file, otherwise they are read into memory.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an embedding store")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported embedding store version {header['version']}")
+
+    dtype = DTYPES[header["dtype"]]
+    shape = tuple(header["shape"])
+    offset = len(MAGIC) + 8 + header_length
+    offset += -offset % ALIGNMENT
+    if mmap and shape[0] > 0:
+        vectors = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+    else:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            vectors = np.fromfile(f, dtype=dtype, count=shape[0] * shape[1]).reshape(shape)
+    return EmbeddingStore(header["ids"], vectors, header["columns"])
+
+
+def convert_json(json_path, store_path=None, dtype="float32"):
+    """
+    Convert a JSON embeddings file to a store file next to it.
+    Handles both layouts used in this repo: a list of chunks with id, text
+    and embedding (rag_ingested_chunks.json), and a dict of key to vector
+    (VectorEmbedding/embeddings/*.json).
+    """
+    json_path = pathlib.Path(json_path)
+    store_path = pathlib.Path(store_path) if store_path else json_path.with_suffix(".emb")
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        ids = list(data.keys())
+        vectors = list(data.values())
+        columns = {}
+    else:
+        ids = [item["id"] for item in data]
+        vectors = [item["embedding"] for item in data]
+        column_names = [name for name in data[0] if name not in ("id", "embedding")] if data else []
+        columns = {name: [item[name] for item in data] for name in column_names}
+
+    save_store(store_path, ids, vectors, columns=columns, dtype=dtype)
+    return store_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JSON embeddings files to binary embedding stores")
+    parser.add_argument("json_paths", nargs="+", help="JSON files to convert, each written next to itself as .emb")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="float32")
+    args = parser.parse_args()
+    for json_path in args.json_paths:
+        print(f"Wrote {convert_json(json_path, dtype=args.dtype)}")
@@ -1,17 +1,13 @@
 import csv
-import os
+import pathlib
+import sys
 
-import azure.identity
-import openai
-from dotenv import load_dotenv
-from lunr import lunr
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
+from openai_clients import API_HOST, MODEL_NAME, get_client
+from text_index import load_or_build_index
 
-if API_HOST == "github":
-    client = openai.OpenAI(base_url="https://models.github.ai/inference", api_key=os.environ["GITHUB_TOKEN"])
-    MODEL_NAME = os.getenv("GITHUB_MODEL", "openai/gpt-4o")
+client = get_client()
 
 
 # Index the data from the CSV
@@ -19,7 +15,7 @@ with open("RAG/hybrid.csv") as file:
     reader = csv.reader(file)
     rows = list(reader)
 documents = [{"id": (i + 1), "body": " ".join(row)} for i, row in enumerate(rows[1:])]
-index = lunr(ref="id", fields=["body"], documents=documents)
+index = load_or_build_index("RAG/hybrid.csv", ref="id", fields=["body"], documents=documents)
 
 # Get the user question
 user_question = "how fast is the prius v?"
@@ -0,0 +1,50 @@
+from sentence_transformers import CrossEncoder
+
+
+class Reranker:
+    """
+    Cross-encoder reranker that loads the model once and is reused for every query.
+    Query/passage pairs are scored in batches, only the first `max_candidates`
+    documents are reranked, and passages are cut to fit the model's max length
+    before scoring.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32, max_candidates=20):
+        self.encoder = CrossEncoder(model_name)
+        self.tokenizer = self.encoder.tokenizer
+        self.max_length = self.encoder.max_length or self.tokenizer.model_max_length
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+
+    def truncate_passages(self, query, passages):
+        """
+        Cut each passage so that the query, the passage and the special tokens fit in the model's max length.
+        Tokens past that limit would be dropped by the model anyway, this avoids encoding them.
+        """
+        query_length = len(self.tokenizer(query, add_special_tokens=False)["input_ids"])
+        special_tokens = self.tokenizer.num_special_tokens_to_add(pair=True)
+        passage_length = max(self.max_length - query_length - special_tokens, 1)
+        encoded = self.tokenizer(passages, add_special_tokens=False)["input_ids"]
+        return [
+            self.tokenizer.decode(token_ids[:passage_length]) if len(token_ids) > passage_length else passage
+            for passage, token_ids in zip(passages, encoded)
+        ]
+
+    def score(self, query, passages):
+        """
+        Return the relevance score of each passage for the query.
+        """
+        if not passages:
+            return []
+        passages = self.truncate_passages(query, passages)
+        return self.encoder.predict([(query, passage) for passage in passages], batch_size=self.batch_size)
+
+    def rerank(self, query, documents):
+        """
+        Rerank the first `max_candidates` documents by relevance to the query.
+        Documents past the cap keep their original order after the reranked ones.
+        """
+        candidates = documents[: self.max_candidates]
+        scores = self.score(query, [doc["text"] for doc in candidates])
+        ranked = [doc for _, doc in sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)]
+        return ranked + documents[self.max_candidates :]
@@ -0,0 +1,39 @@
+import hashlib
+import json
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from index_files import file_hash, write_json
+from lunr import lunr
+from lunr.index import Index
+
+
+def index_path(source_path):
+    """
+    Return the path of the lunr index saved next to its source data file.
+    """
+    source_path = pathlib.Path(source_path)
+    return source_path.with_name(source_path.name + ".lunr.json")
+
+
+def load_or_build_index(source_path, ref, fields, documents):
+    """
+    Load the full-text index saved next to the source data file, or build it
+    from the documents and save it when it is missing or stale. The saved
+    index is stale when the source file, the ref or the fields have changed.
+    """
+    source_hash = hashlib.sha256(
+        json.dumps({"source": file_hash(source_path), "ref": ref, "fields": fields}).encode("utf-8")
+    ).hexdigest()
+    path = index_path(source_path)
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("source_hash") == source_hash:
+            return Index.load(saved["index"])
+
+    index = lunr(ref=ref, fields=fields, documents=documents)
+    write_json(path, {"source_hash": source_hash, "index": index.serialize()})
+    return index
@@ -0,0 +1,59 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from ranking import top_k
+
+
+class ExactVectorIndex:
+    """
+    Exhaustive cosine similarity search over a matrix of embeddings.
+    The document norms are computed once when the index is built, so a query
+    only costs one matrix-vector product plus a top-k selection.
+    """
+
+    def __init__(self, ids, vectors):
+        self.ids = list(ids)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        if self.vectors.ndim != 2 or len(self.vectors) != len(self.ids):
+            raise ValueError(f"Expected a ({len(self.ids)}, dim) matrix, got shape {self.vectors.shape}")
+        norms = np.linalg.norm(self.vectors, axis=1)
+        # Zero vectors would divide by zero, give them a similarity of 0 instead
+        self.inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    @classmethod
+    def from_documents(cls, documents):
+        return cls([doc["id"] for doc in documents], [doc["embedding"] for doc in documents])
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.ids, store.vectors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def similarities(self, query_vector):
+        """
+        Return the cosine similarity of the query to every indexed vector.
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if query_vector.shape != (self.dim,):
+            raise ValueError(f"Query has shape {query_vector.shape}, the index holds {self.dim}-dimensional vectors")
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        return (self.vectors @ query_vector) * self.inverse_norms / query_norm
+
+    def search(self, query_vector, limit):
+        """
+        Return the ids and cosine similarities of the `limit` closest vectors, best first.
+        """
+        scores = self.similarities(query_vector)
+        rows = top_k(scores, limit)[0]
+        return [self.ids[row] for row in rows], scores[rows]
@@ -0,0 +1,171 @@
+"""
+Streaming reader for the JSON embeddings files ({"key": [value, ...], ...}).
+
+json.load turns every value into a Python float inside a list inside a dict, which
+takes several times the memory of the float32 matrix the notebooks end up using.
+This reader scans the file in blocks and parses each vector straight into float32,
+so peak memory follows the size of the matrix being filled.
+"""
+
+import json
+
+import numpy as np
+
+WHITESPACE = " \t\n\r"
+
+
+class _Scanner:
+    """
+    A window over a text file that reads the next block only when the parser needs more text.
+    """
+
+    def __init__(self, f, block_size):
+        self.f = f
+        self.block_size = block_size
+        self.text = ""
+        self.pos = 0
+
+    def read_more(self):
+        block = self.f.read(self.block_size)
+        if not block:
+            return False
+        self.text = self.text[self.pos :] + block
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """
+        Skip whitespace and return the next character without consuming it, None at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return None
+
+    def expect(self, char):
+        if self.next_char() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the current block")
+        self.pos += 1
+
+    def read_string(self, decoder):
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def read_until(self, char):
+        """
+        Return the text up to the next `char` and move past it.
+        """
+        start = self.pos
+        while True:
+            end = self.text.find(char, start)
+            if end >= 0:
+                text = self.text[self.pos : end]
+                self.pos = end + 1
+                return text
+            start = len(self.text) - self.pos
+            if not self.read_more():
+                raise ValueError(f"Unexpected end of file while looking for {char!r}")
+
+
+def iter_embeddings(path, keys=None, block_size=1 << 20):
+    """
+    Yield the (key, float32 vector) pairs of an embeddings file in file order.
+    With `keys`, only those keys are parsed, the vectors of the others are skipped over as text.
+    """
+    keys = None if keys is None else set(keys)
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        scanner = _Scanner(f, block_size)
+        scanner.expect("{")
+        if scanner.next_char() == "}":
+            return
+        while True:
+            if scanner.next_char() != '"':
+                raise ValueError(f"Expected a key in {path}")
+            key = scanner.read_string(decoder)
+            scanner.expect(":")
+            scanner.expect("[")
+            # The vectors are flat lists of numbers, so the list ends at the next "]"
+            text = scanner.read_until("]")
+            if keys is None or key in keys:
+                vector = np.fromstring(text, dtype=np.float32, sep=",")
+                if len(vector) != text.count(",") + 1:
+                    raise ValueError(f"Could not parse the vector of {key!r} in {path}")
+                yield key, vector
+
+            separator = scanner.next_char()
+            scanner.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' after the vector of {key!r} in {path}")
+
+
+def iter_embedding_batches(path, batch_size, keys=None, block_size=1 << 20):
+    """
+    Yield (keys, float32 matrix) batches of at most `batch_size` vectors of an embeddings file in file order,
+    so a file can be processed with the memory of one batch instead of the whole matrix.
+    """
+    batch_keys = []
+    matrix = None
+    for key, vector in iter_embeddings(path, keys=keys, block_size=block_size):
+        if matrix is None:
+            matrix = np.empty((batch_size, len(vector)), dtype=np.float32)
+        matrix[len(batch_keys)] = vector
+        batch_keys.append(key)
+        if len(batch_keys) == batch_size:
+            yield batch_keys, matrix.copy()
+            batch_keys = []
+    if batch_keys:
+        yield batch_keys, matrix[: len(batch_keys)].copy()
+
+
+def load_embeddings(path, keys=None, block_size=1 << 20):
+    """
+    Return (keys, matrix) with the vectors of an embeddings file as rows of a float32 matrix.
+
+    With `keys`, the matrix is allocated once for those keys and its rows follow their order,
+    keys missing from the file are left out. Without, the matrix grows by doubling while
+    the file is read and is shrunk in place to the number of vectors at the end.
+    """
+    if keys is not None:
+        keys = list(dict.fromkeys(keys))
+        rows = {key: row for row, key in enumerate(keys)}
+        found = np.zeros(len(keys), dtype=bool)
+        matrix = None
+        for key, vector in iter_embeddings(path, keys=rows, block_size=block_size):
+            if matrix is None:
+                matrix = np.empty((len(keys), len(vector)), dtype=np.float32)
+            matrix[rows[key]] = vector
+            found[rows[key]] = True
+        if matrix is None:
+            return [], np.empty((0, 0), dtype=np.float32)
+        if not found.all():
+            keys = [key for key, is_found in zip(keys, found) if is_found]
+            matrix = matrix[found]
+        return keys, matrix
+
+    found_keys = []
+    matrix = None
+    for key, vector in iter_embeddings(path, block_size=block_size):
+        if matrix is None:
+            matrix = np.empty((1024, len(vector)), dtype=np.float32)
+        elif len(found_keys) == len(matrix):
+            matrix.resize((2 * len(matrix), matrix.shape[1]), refcheck=False)
+        matrix[len(found_keys)] = vector
+        found_keys.append(key)
+    if matrix is None:
+        return [], np.empty((0, 0), dtype=np.float32)
+    matrix.resize((len(found_keys), matrix.shape[1]), refcheck=False)
+    return found_keys, matrix
+
@@ -0,0 +1,119 @@
+"""
+HNSW index over an embeddings file (movies, words, ...) answering batches of queries at once.
+
+A built index is saved next to its source file as two files:
+    movies_text-embedding-3-small-1536.hnsw        the hnswlib graph
+    movies_text-embedding-3-small-1536.hnsw.json   keys, index parameters and source fingerprint
+"""
+
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import hnswlib
+import numpy as np
+from embedding_io import load_embeddings
+from index_files import file_hash, load_metadata, save_metadata
+from search_utils import as_queries
+
+
+class HnswIndex:
+    """
+    hnswlib index whose labels are the row numbers of `keys`. The keys are kept
+    in an array, so turning the labels of a whole batch of results into titles
+    is a single indexing operation instead of a lookup per result.
+    """
+
+    def __init__(self, keys, vectors, M=16, ef_construction=200, ef=50, num_threads=-1):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.keys = np.array(keys, dtype=object)
+        self.num_threads = num_threads
+        self.fingerprint = None
+        self.index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=M)
+        self.index.add_items(vectors, np.arange(len(vectors)), num_threads=num_threads)
+        self.index.set_ef(ef)
+
+    @classmethod
+    def from_dict(cls, vectors, **kwargs):
+        return cls(list(vectors.keys()), list(vectors.values()), **kwargs)
+
+    def __len__(self):
+        return self.index.element_count
+
+    def set_ef(self, ef):
+        """
+        Set the size of the candidate list used at query time, it should always be larger than k.
+        """
+        self.index.set_ef(ef)
+
+    def knn_query(self, query_vectors, k=10):
+        """
+        Return the labels and cosine similarities, both of shape (queries, k), of the k nearest
+        neighbours of every query. The queries are searched in parallel on `num_threads` threads.
+        """
+        labels, distances = self.index.knn_query(as_queries(query_vectors), k=k, num_threads=self.num_threads)
+        return labels, 1 - distances
+
+    def query(self, query_vectors, k=10):
+        """
+        Return the keys and cosine similarities, both of shape (queries, k), of the k nearest neighbours of every query.
+        """
+        labels, similarities = self.knn_query(query_vectors, k=k)
+        return self.keys[labels], similarities
+
+    def save(self, path, fingerprint=None):
+        """
+        Save the graph and, next to it, the keys, parameters and the fingerprint of the source data.
+        """
+        path = pathlib.Path(path)
+        self.fingerprint = fingerprint or self.fingerprint
+        self.index.save_index(str(path))
+        metadata = {
+            "space": self.index.space,
+            "dim": self.index.dim,
+            "M": self.index.M,
+            "ef_construction": self.index.ef_construction,
+            "ef": self.index.ef,
+            "fingerprint": self.fingerprint,
+            "keys": self.keys.tolist(),
+        }
+        save_metadata(path, metadata)
+
+    @classmethod
+    def load(cls, path, num_threads=-1):
+        path = pathlib.Path(path)
+        metadata = load_metadata(path)
+        if metadata is None:
+            raise FileNotFoundError(f"{path} has no metadata file next to it")
+        hnsw_index = cls.__new__(cls)
+        hnsw_index.keys = np.array(metadata["keys"], dtype=object)
+        hnsw_index.num_threads = num_threads
+        hnsw_index.fingerprint = metadata["fingerprint"]
+        hnsw_index.index = hnswlib.Index(space=metadata["space"], dim=metadata["dim"])
+        hnsw_index.index.load_index(str(path), max_elements=len(hnsw_index.keys))
+        hnsw_index.index.set_ef(metadata["ef"])
+        return hnsw_index
+
+    @classmethod
+    def load_or_build(cls, source_path, path=None, M=16, ef_construction=200, ef=50, num_threads=-1):
+        """
+        Load the index saved next to a JSON embeddings file, or build and save it when there is
+        no saved index, or when the source file or the construction parameters have changed.
+        """
+        source_path = pathlib.Path(source_path)
+        path = pathlib.Path(path) if path else source_path.with_suffix(".hnsw")
+        fingerprint = file_hash(source_path)
+        metadata = load_metadata(path) if path.exists() else None
+        saved = metadata and (metadata["fingerprint"], metadata["M"], metadata["ef_construction"])
+        if saved == (fingerprint, M, ef_construction):
+            hnsw_index = cls.load(path, num_threads=num_threads)
+            hnsw_index.set_ef(ef)
+            return hnsw_index
+
+        keys, vectors = load_embeddings(source_path)
+        hnsw_index = cls(keys, vectors, M=M, ef_construction=ef_construction, ef=ef, num_threads=num_threads)
+        hnsw_index.save(path, fingerprint=fingerprint)
+        return hnsw_index
+
@@ -0,0 +1,66 @@
+"""
+Two-pass search for Matryoshka (MRL) embeddings such as text-embedding-3-small,
+whose leading dimensions carry most of the meaning on their own.
+"""
+
+from search_utils import as_queries, benchmark, exact_search, normalize, rescore, top_k
+
+
+class MatryoshkaIndex:
+    """
+    A first pass compares the queries against the leading `dims` dimensions of
+    every vector (renormalized to unit length), then the best `shortlist`
+    candidates are rescored at full dimensionality.
+    """
+
+    def __init__(self, vectors, dims=256, shortlist=100):
+        self.vectors = normalize(vectors)
+        self.dims = dims
+        self.shortlist = shortlist
+        self._truncated = {}
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def truncated(self, dims):
+        """
+        Return the vectors cut to their first `dims` dimensions and renormalized, computed once per dims value.
+        """
+        if dims not in self._truncated:
+            self._truncated[dims] = normalize(self.vectors[:, :dims])
+        return self._truncated[dims]
+
+    def search(self, query_vectors, k, dims=None, shortlist=None):
+        """
+        Return (indices, similarities) of the k closest vectors for each query,
+        the similarities are the full-dimension cosine similarities.
+        """
+        dims = dims or self.dims
+        shortlist = max(shortlist or self.shortlist, k)
+        queries = normalize(as_queries(query_vectors))
+
+        first_pass = normalize(queries[:, :dims]) @ self.truncated(dims).T
+        candidates = top_k(first_pass, shortlist)
+        return rescore(queries, self.vectors, candidates, k)
+
+
+def recall_latency_report(index, query_vectors, k=10, dims_values=(64, 128, 256, 512), shortlist_values=(20, 50, 100)):
+    """
+    Compare every (dims, shortlist) combination against exhaustive full-dimension search,
+    returns one row per combination with recall@k and latency per query in milliseconds.
+    """
+    true_indices, _ = exact_search(index.vectors, query_vectors, k, normalized=True)
+    report = [
+        {"dims": index.vectors.shape[1], "shortlist": None}
+        | benchmark(
+            lambda queries: exact_search(index.vectors, queries, k, normalized=True)[0], query_vectors, true_indices
+        )
+    ]
+    for dims in dims_values:
+        index.truncated(dims)
+        for shortlist in shortlist_values:
+            result = benchmark(
+                lambda queries: index.search(queries, k, dims=dims, shortlist=shortlist)[0], query_vectors, true_indices
+            )
+            report.append({"dims": dims, "shortlist": shortlist} | result)
+    return report
@@ -0,0 +1,236 @@
+"""
+Inverted file + product quantization (IVF-PQ) index for cosine similarity search.
+
+The vectors are normalized and assigned to the closest of `nlist` coarse centroids.
+What is left of each vector after subtracting its centroid (the residual) is cut into
+`m` subvectors, and each subvector is replaced by the number of its closest centroid in
+a codebook of 2**nbits centroids trained for that subspace. A vector is stored as m
+codes of nbits each, 64 bytes for m=64 and nbits=8 instead of 6144 bytes of float32.
+
+A query only visits the `nprobe` lists whose coarse centroids are closest to it, and
+scores their vectors with asymmetric distance computation: the query is never quantized,
+the dot products of its subvectors with every codebook centroid are computed once into
+a table, and the score of a stored vector is its list's centroid score plus m table lookups.
+The best candidates can then be rescored with the original float32 vectors if they are kept.
+"""
+
+import json
+
+import numpy as np
+from search_utils import as_queries, benchmark, exact_search, normalize, top_k
+from sklearn.cluster import KMeans
+
+
+class IvfPqIndex:
+    def __init__(self, dim, nlist=32, m=64, nbits=8, nprobe=8, keep_originals=False, seed=0):
+        if dim % m:
+            raise ValueError(f"The dimension {dim} is not divisible into {m} subvectors")
+        if nbits > 8:
+            raise ValueError("Codes are stored as uint8, nbits must be 8 or less")
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.nbits = nbits
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.codebooks = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self.offsets = np.zeros(nlist + 1, dtype=np.int64)
+        self.originals = np.empty((0, dim), dtype=np.float32) if keep_originals else None
+
+    @classmethod
+    def build(cls, vectors, **kwargs):
+        """
+        Train an index on the vectors and add them, their ids are their row numbers.
+        """
+        vectors = normalize(vectors)
+        index = cls(vectors.shape[1], **kwargs)
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def code_size(self):
+        """
+        Bytes per stored vector.
+        """
+        return self.codes.shape[1] * self.codes.itemsize
+
+    @property
+    def nbytes(self):
+        nbytes = self.codes.nbytes + self.ids.nbytes + self.centroids.nbytes + self.codebooks.nbytes
+        return nbytes + (self.originals.nbytes if self.originals is not None else 0)
+
+    def _kmeans(self, vectors, n_clusters):
+        return KMeans(n_clusters=n_clusters, n_init=1, random_state=self.seed).fit(vectors)
+
+    def _residuals(self, vectors, lists):
+        return (vectors - self.centroids[lists]).reshape(len(vectors), self.m, self.dim // self.m)
+
+    def train(self, vectors):
+        """
+        Learn the coarse centroids, then one codebook per subspace from the residuals.
+        """
+        vectors = normalize(vectors)
+        if len(vectors) < max(self.nlist, 2**self.nbits):
+            raise ValueError(f"Training needs at least {max(self.nlist, 2**self.nbits)} vectors, got {len(vectors)}")
+        coarse = self._kmeans(vectors, self.nlist)
+        self.centroids = coarse.cluster_centers_.astype(np.float32)
+        residuals = self._residuals(vectors, coarse.labels_)
+        self.codebooks = np.stack(
+            [self._kmeans(residuals[:, j], 2**self.nbits).cluster_centers_ for j in range(self.m)]
+        ).astype(np.float32)
+        return self
+
+    def assign(self, vectors):
+        """
+        Return the number of the closest coarse centroid of every (normalized) vector.
+        """
+        return top_k(vectors @ self.centroids.T, 1)[:, 0]
+
+    def encode(self, residuals):
+        """
+        Return the (vectors, m) uint8 codes of residuals already split into subvectors.
+        """
+        codes = np.empty(residuals.shape[:2], dtype=np.uint8)
+        for j in range(self.m):
+            # Closest centroid by squared L2 distance, the |r|^2 term is the same for every centroid
+            codebook = self.codebooks[j]
+            distances = (codebook**2).sum(axis=1) - 2 * residuals[:, j] @ codebook.T
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def decode(self, lists, codes):
+        """
+        Return the approximate (normalized) vectors stored under the given lists and codes.
+        """
+        subvectors = self.codebooks[np.arange(self.m), codes]
+        return self.centroids[lists] + subvectors.reshape(len(codes), self.dim)
+
+    def add(self, vectors, ids=None):
+        """
+        Encode vectors into the inverted lists, the ids default to the next row numbers.
+        """
+        if self.centroids is None:
+            raise ValueError("The index has to be trained before vectors are added")
+        vectors = normalize(vectors)
+        ids = np.arange(len(self), len(self) + len(vectors)) if ids is None else np.asarray(ids, dtype=np.int64)
+        lists = self.assign(vectors)
+        codes = self.encode(self._residuals(vectors, lists))
+
+        # Keep the codes sorted by list, so the codes of list l are codes[offsets[l]:offsets[l + 1]]
+        all_lists = np.concatenate([np.repeat(np.arange(self.nlist), np.diff(self.offsets)), lists])
+        order = np.argsort(all_lists, kind="stable")
+        self.ids = np.concatenate([self.ids, ids])[order]
+        self.codes = np.concatenate([self.codes, codes])[order]
+        if self.originals is not None:
+            self.originals = np.concatenate([self.originals, vectors])[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(all_lists, minlength=self.nlist))])
+        return self
+
+    def search(self, query_vectors, k, nprobe=None, rescore=None):
+        """
+        Return (ids, similarities) of shape (queries, k) of the approximate k closest vectors
+        of each query, searching its `nprobe` closest lists. Queries that find fewer
+        than k vectors are padded with id -1 and similarity -inf.
+        With rescore=n, the n best candidates of each query are rescored with the float32
+        originals (requires keep_originals=True) and the similarity is the exact cosine.
+        """
+        if rescore and self.originals is None:
+            raise ValueError("Rescoring needs the index to be built with keep_originals=True")
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = normalize(as_queries(query_vectors))
+        centroid_scores = queries @ self.centroids.T
+        probes = top_k(centroid_scores, nprobe)
+        # Dot product of every query subvector with every codebook centroid: (queries, m, 2**nbits)
+        tables = np.einsum("qjd,jcd->qjc", queries.reshape(len(queries), self.m, -1), self.codebooks)
+
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        subspaces = np.arange(self.m)
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+            if not len(rows):
+                continue
+            list_scores = np.repeat(centroid_scores[i, lists], np.diff(self.offsets)[lists])
+            scores = list_scores + tables[i, subspaces, self.codes[rows]].sum(axis=1)
+            if rescore:
+                rows = rows[top_k(scores, max(rescore, k))[0]]
+                scores = self.originals[rows] @ queries[i]
+            best = top_k(scores, k)[0]
+            result_ids[i, : len(best)] = self.ids[rows[best]]
+            result_scores[i, : len(best)] = scores[best]
+        return result_ids, result_scores
+
+    def save(self, path):
+        parameters = {
+            "dim": self.dim,
+            "nlist": self.nlist,
+            "m": self.m,
+            "nbits": self.nbits,
+            "nprobe": self.nprobe,
+            "keep_originals": self.originals is not None,
+            "seed": self.seed,
+        }
+        arrays = {"originals": self.originals} if self.originals is not None else {}
+        np.savez(
+            path,
+            parameters=np.array(json.dumps(parameters)),
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            ids=self.ids,
+            codes=self.codes,
+            offsets=self.offsets,
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(**json.loads(str(data["parameters"])))
+            index.centroids = data["centroids"]
+            index.codebooks = data["codebooks"]
+            index.ids = data["ids"]
+            index.codes = data["codes"]
+            index.offsets = data["offsets"]
+            if "originals" in data:
+                index.originals = data["originals"]
+        return index
+
+
+def recall_latency_report(
+    vectors,
+    query_vectors,
+    k=10,
+    nlist=32,
+    m_values=(32, 64, 96),
+    nprobe_values=(1, 4, 8, 16),
+    rescore_values=(None, 50),
+):
+    """
+    Build an index per code size (m) and compare every (m, nprobe, rescore) combination against
+    exhaustive search, returns one row per combination with the bytes per vector,
+    recall@k and latency per query in milliseconds.
+    """
+    vectors = normalize(vectors)
+    true_indices, _ = exact_search(vectors, query_vectors, k, normalized=True)
+    report = [
+        {"m": None, "nprobe": None, "rescore": None, "code_size": vectors.shape[1] * vectors.itemsize}
+        | benchmark(lambda queries: exact_search(vectors, queries, k, normalized=True)[0], query_vectors, true_indices)
+    ]
+    for m in m_values:
+        index = IvfPqIndex.build(vectors, nlist=nlist, m=m, keep_originals=any(rescore_values))
+        for nprobe in nprobe_values:
+            for rescore in rescore_values:
+                result = benchmark(
+                    lambda queries: index.search(queries, k, nprobe=nprobe, rescore=rescore)[0],
+                    query_vectors,
+                    true_indices,
+                )
+                report.append({"m": m, "nprobe": nprobe, "rescore": rescore, "code_size": index.code_size} | result)
+    return report
@@ -0,0 +1,144 @@
+"""
+PCA projection of embedding sets (to 3 dimensions for the plots of embeddings_similarity.ipynb),
+fitted in mini-batches so it never needs the whole set in memory at once.
+
+A projection fitted on an embeddings file is saved next to it, e.g.
+    words_word2vec-google-news.pca3.npz   components, mean and source fingerprint
+and reused until the file changes.
+"""
+
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from embedding_io import iter_embedding_batches
+from index_files import file_hash
+from sklearn.decomposition import IncrementalPCA
+from sklearn.utils import gen_batches
+
+
+class PcaProjection:
+    """
+    Principal component projection fitted with sklearn's IncrementalPCA, one batch of
+    `batch_size` vectors at a time. When the whole set fits in a single batch the result
+    is the same as PCA. Once fitted, new vectors are projected with a matrix product.
+    """
+
+    def __init__(self, n_components=3, batch_size=4096):
+        self.n_components = n_components
+        self.batch_size = batch_size
+        self.components = None
+        self.mean = None
+        self.explained_variance_ratio = None
+        self.fingerprint = None
+        self._pca = None
+
+    def partial_fit(self, batch):
+        """
+        Update the components with one batch of vectors, which needs at least n_components rows.
+        """
+        if self._pca is None:
+            self._pca = IncrementalPCA(n_components=self.n_components)
+        self._pca.partial_fit(np.asarray(batch, dtype=np.float32))
+        self.components = self._pca.components_.astype(np.float32)
+        self.mean = self._pca.mean_.astype(np.float32)
+        self.explained_variance_ratio = self._pca.explained_variance_ratio_
+        return self
+
+    def fit_batches(self, batches):
+        """
+        Fit on an iterable of 2-D arrays of vectors, one partial_fit per array.
+        A last batch smaller than n_components is merged into the one before it.
+        """
+        previous = None
+        for batch in batches:
+            if previous is not None and len(batch) < self.n_components:
+                batch = np.concatenate([previous, batch])
+            elif previous is not None:
+                self.partial_fit(previous)
+            previous = batch
+        if previous is not None:
+            self.partial_fit(previous)
+        return self
+
+    def fit(self, vectors):
+        """
+        Fit on a 2-D array (or memmap) of vectors, reading it `batch_size` rows at a time.
+        """
+        return self.fit_batches(vectors[batch] for batch in gen_batches(len(vectors), self.batch_size))
+
+    def fit_file(self, path):
+        """
+        Fit on a JSON embeddings file, parsing it `batch_size` vectors at a time.
+        """
+        return self.fit_batches(batch for _, batch in iter_embedding_batches(path, self.batch_size))
+
+    def transform(self, vectors):
+        """
+        Project vectors (one or many) onto the fitted components, without refitting.
+        """
+        if self.components is None:
+            raise ValueError("The projection has not been fitted yet")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return (vectors - self.mean) @ self.components.T
+
+    def project(self, keys, vectors):
+        """
+        Return a dict of key: projected vector, the format render_vectors_3d expects.
+        """
+        return dict(zip(keys, self.transform(vectors)))
+
+    def project_file(self, path, keys=None):
+        """
+        Return a dict of key: projected vector for the vectors of a JSON embeddings file (only `keys`
+        when given), parsing and projecting it `batch_size` vectors at a time.
+        """
+        projected = {}
+        for batch_keys, batch in iter_embedding_batches(path, self.batch_size, keys=keys):
+            projected.update(self.project(batch_keys, batch))
+        return projected
+
+    def save(self, path):
+        np.savez(
+            path,
+            components=self.components,
+            mean=self.mean,
+            explained_variance_ratio=self.explained_variance_ratio,
+            fingerprint=np.array(self.fingerprint or ""),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            projection = cls(n_components=len(data["components"]))
+            projection.components = data["components"]
+            projection.mean = data["mean"]
+            projection.explained_variance_ratio = data["explained_variance_ratio"]
+            projection.fingerprint = str(data["fingerprint"]) or None
+        return projection
+
+    @classmethod
+    def load_or_fit(cls, source_path, path=None, n_components=3, batch_size=4096, vectors=None):
+        """
+        Load the projection saved next to a JSON embeddings file, or fit and save it when
+        there is none yet or the file has changed since it was fitted. The file is streamed
+        `batch_size` vectors at a time, unless its vectors are passed in already loaded.
+        """
+        source_path = pathlib.Path(source_path)
+        path = pathlib.Path(path) if path else source_path.with_suffix(f".pca{n_components}.npz")
+        fingerprint = file_hash(source_path)
+        if path.exists():
+            projection = cls.load(path)
+            if projection.fingerprint == fingerprint and projection.n_components == n_components:
+                return projection
+
+        projection = cls(n_components=n_components, batch_size=batch_size)
+        if vectors is None:
+            projection.fit_file(source_path)
+        else:
+            projection.fit(vectors)
+        projection.fingerprint = fingerprint
+        projection.save(path)
+        return projection
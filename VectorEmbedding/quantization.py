@@ -0,0 +1,216 @@
+"""
+Quantized vector indexes, vectorized versions of the techniques shown in compressing_vectors.ipynb.
+"""
+
+import numpy as np
+from search_utils import as_queries, normalize, rescore as rescore_candidates, top_k
+
+NUM_LEVELS = 256
+MIN_LEVEL = -128
+MAX_LEVEL = 127
+
+
+class ScalarQuantizer:
+    """
+    Map floats to int8 by min/max calibration: each value is normalized to [0, 1]
+    between the calibrated min and max, then spread over the 256 int8 levels.
+
+    With per_dimension=False there is a single min and max for all values
+    (what scalar_quantization in the notebook does), with per_dimension=True
+    every dimension gets its own range, which keeps more precision for
+    dimensions with a narrow spread.
+    """
+
+    def __init__(self, per_dimension=False):
+        self.per_dimension = per_dimension
+        self.min = None
+        self.max = None
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        axis = 0 if self.per_dimension else None
+        self.min = vectors.min(axis=axis)
+        self.max = vectors.max(axis=axis)
+        return self
+
+    @property
+    def scale(self):
+        """
+        The float step between two neighbouring int8 levels.
+        """
+        spread = np.asarray(self.max - self.min, dtype=np.float32)
+        return np.where(spread > 0, spread, 1.0) / (NUM_LEVELS - 1)
+
+    def quantize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        normalized = np.clip((vectors - self.min) / (self.scale * (NUM_LEVELS - 1)), 0, 1)
+        return (np.round(normalized * (NUM_LEVELS - 1)) + MIN_LEVEL).astype(np.int8)
+
+    def dequantize(self, codes):
+        return (codes.astype(np.float32) - MIN_LEVEL) * self.scale + self.min
+
+
+class ScalarQuantizedIndex:
+    """
+    Cosine similarity search over int8 codes, a quarter of the memory of float32 vectors.
+
+    A stored value is approximated as x = scale * code + offset, so for a query q:
+        q . x = (q * scale) . code + q . offset
+    The query is weighted by the scale and quantized to int8 itself, so the first term
+    is an integer dot product against the stored codes. The top candidates can then
+    be rescored with the original float32 vectors if they are kept.
+    """
+
+    def __init__(self, vectors, per_dimension=False, keep_originals=False, block_size=8192):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.quantizer = ScalarQuantizer(per_dimension=per_dimension).fit(vectors)
+        self.codes = self.quantizer.quantize(vectors)
+        self.offset = np.broadcast_to(self.quantizer.min - MIN_LEVEL * self.quantizer.scale, vectors.shape[1:])
+        self.offset = self.offset.astype(np.float32)
+        self.scale = np.broadcast_to(self.quantizer.scale, vectors.shape[1:]).astype(np.float32)
+        # The norm of every reconstructed vector, needed to turn the dot product into a cosine similarity
+        norms = np.concatenate(
+            [
+                np.linalg.norm(self.quantizer.dequantize(self.codes[start : start + block_size]), axis=1)
+                for start in range(0, len(self.codes), block_size)
+            ]
+        )
+        self.inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        self.originals = normalize(vectors) if keep_originals else None
+        self.block_size = block_size
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        nbytes = self.codes.nbytes + self.inverse_norms.nbytes
+        return nbytes + (self.originals.nbytes if self.originals is not None else 0)
+
+    def integer_dot(self, query_codes):
+        """
+        Dot products of int8 query codes with every stored code.
+        The codes are widened to float32 one block at a time so the product runs on BLAS,
+        which is several times faster than numpy's int32 matmul. Sums of int8 products
+        stay exact integers up to 2**24, past that the rounding is far below the quantization error.
+        """
+        query_codes = query_codes.astype(np.float32).T
+        return np.concatenate(
+            [
+                self.codes[start : start + self.block_size].astype(np.float32) @ query_codes
+                for start in range(0, len(self.codes), self.block_size)
+            ]
+        ).T
+
+    def scores(self, query_vectors):
+        """
+        Return the approximate cosine similarity of each query to every stored vector.
+        """
+        queries = normalize(as_queries(query_vectors))
+        weighted = queries * self.scale
+        # Quantize each weighted query symmetrically to int8, with its own scale
+        query_scales = np.abs(weighted).max(axis=1, keepdims=True) / MAX_LEVEL
+        query_scales[query_scales == 0] = 1
+        query_codes = np.round(weighted / query_scales).astype(np.int8)
+        dots = self.integer_dot(query_codes) * query_scales + (queries @ self.offset)[:, np.newaxis]
+        return dots * self.inverse_norms
+
+    def search(self, query_vectors, k, rescore=None):
+        """
+        Return (indices, similarities) of the k closest vectors for each query.
+        With rescore=n, the n best int8 candidates are rescored with the float32
+        originals (requires keep_originals=True) before picking the top k.
+        """
+        scores = self.scores(query_vectors)
+        if not rescore:
+            indices = top_k(scores, k)
+            return indices, np.take_along_axis(scores, indices, axis=1)
+        if self.originals is None:
+            raise ValueError("Rescoring needs the index to be built with keep_originals=True")
+
+        candidates = top_k(scores, max(rescore, k))
+        return rescore_candidates(normalize(as_queries(query_vectors)), self.originals, candidates, k)
+
+
+def popcount(words):
+    """
+    Count the set bits of every element of an unsigned integer array.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    # numpy < 2.0 has no popcount ufunc, count the bits of each byte with a lookup table
+    byte_counts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1).astype(np.uint8)
+    return byte_counts[words.view(np.uint8)].reshape(*words.shape, words.itemsize).sum(axis=-1)
+
+
+def pack_bits(bits):
+    """
+    Pack rows of 0/1 values into uint64 words, padding each row with zero bits to a multiple of 64.
+    """
+    packed = np.packbits(np.asarray(bits, dtype=bool), axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class BinaryQuantizedIndex:
+    """
+    Search over 1-bit codes, 32 times less memory than float32 vectors.
+
+    Each value becomes 1 if it is above the threshold and 0 otherwise (the notebook's
+    binary_quantization uses the mean of all values as threshold). The bits are packed
+    into uint64 words and compared with XOR + popcount, so the Hamming distance between
+    two 1536-dim vectors costs 24 word operations. The top candidates can then be
+    rescored with the original float32 vectors if they are kept.
+    """
+
+    def __init__(self, vectors, threshold=None, keep_originals=False, block_size=65536):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.dim = vectors.shape[1]
+        self.threshold = float(vectors.mean()) if threshold is None else threshold
+        self.codes = pack_bits(vectors > self.threshold)
+        self.originals = normalize(vectors) if keep_originals else None
+        self.block_size = block_size
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.originals.nbytes if self.originals is not None else 0)
+
+    def quantize(self, vectors):
+        """
+        Return the 0/1 value of every dimension, as the notebook's binary_quantization does.
+        """
+        return (np.asarray(vectors, dtype=np.float32) > self.threshold).astype(np.uint8)
+
+    def hamming_distances(self, query_vectors):
+        """
+        Return the number of differing bits between each query and every stored code.
+        """
+        query_codes = pack_bits(as_queries(query_vectors) > self.threshold)
+        distances = np.empty((len(query_codes), len(self.codes)), dtype=np.int32)
+        for start in range(0, len(self.codes), self.block_size):
+            block = self.codes[start : start + self.block_size]
+            for i, query_code in enumerate(query_codes):
+                distances[i, start : start + len(block)] = popcount(block ^ query_code).sum(axis=1)
+        return distances
+
+    def search(self, query_vectors, k, rescore=None):
+        """
+        Return (indices, similarities) of the k closest vectors for each query.
+        Without rescoring the similarity is the fraction of matching bits,
+        with rescore=n the n best binary candidates are rescored with the float32
+        originals (requires keep_originals=True) and the similarity is the cosine.
+        """
+        similarities = 1 - self.hamming_distances(query_vectors) / self.dim
+        if not rescore:
+            indices = top_k(similarities, k)
+            return indices, np.take_along_axis(similarities, indices, axis=1)
+        if self.originals is None:
+            raise ValueError("Rescoring needs the index to be built with keep_originals=True")
+
+        candidates = top_k(similarities, max(rescore, k))
+        return rescore_candidates(normalize(as_queries(query_vectors)), self.originals, candidates, k)
@@ -0,0 +1,82 @@
+"""
+Shared helpers for the vector search modules: normalization, top-k selection
+(ranking.top_k at the repository root), exhaustive search as ground truth, and recall measurement.
+"""
+
+import pathlib
+import sys
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from ranking import top_k
+
+
+def normalize(vectors):
+    """
+    Scale vectors to unit length so cosine similarity becomes a dot product.
+    Zero vectors are left as zeros.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def as_queries(query_vectors):
+    """
+    Return the queries as a 2-D float32 array, a single vector becomes a batch of one.
+    """
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    return query_vectors[np.newaxis, :] if query_vectors.ndim == 1 else query_vectors
+
+
+def exact_search(vectors, query_vectors, k, normalized=False):
+    """
+    Exhaustive cosine similarity search, returns (indices, similarities) of shape (queries, k).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32) if normalized else normalize(vectors)
+    scores = normalize(as_queries(query_vectors)) @ vectors.T
+    indices = top_k(scores, k)
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def recall_at_k(result_indices, true_indices):
+    """
+    Return the fraction of the true nearest neighbours found in the results, averaged over all queries.
+    """
+    k = np.shape(true_indices)[1]
+    hits = sum(len(set(result[:k]) & set(truth)) for result, truth in zip(result_indices, true_indices))
+    return hits / (len(true_indices) * k) if len(true_indices) else 0.0
+
+
+def benchmark(search, query_vectors, true_indices, repeat=1):
+    """
+    Run `search(query_vectors)` and return its recall against the true neighbours
+    and the mean latency per query in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result_indices = search(query_vectors)
+    elapsed = (time.perf_counter() - start) / repeat
+    return {
+        "recall": recall_at_k(result_indices, true_indices),
+        "latency_ms": 1000 * elapsed / max(len(query_vectors), 1),
+    }
+
+
+def rescore(queries, vectors, candidates, k, batch_size=64):
+    """
+    Rescore candidate indices of shape (queries, candidates) with the given normalized vectors
+    and return (indices, similarities) of the k best, working through the queries in batches
+    so the gathered candidate vectors stay small.
+    """
+    indices = np.empty((len(queries), min(k, candidates.shape[1])), dtype=candidates.dtype)
+    similarities = np.empty(indices.shape, dtype=np.float32)
+    for start in range(0, len(queries), batch_size):
+        batch = slice(start, start + batch_size)
+        scores = np.matmul(vectors[candidates[batch]], queries[batch][:, :, np.newaxis])[:, :, 0]
+        order = top_k(scores, k)
+        indices[batch] = np.take_along_axis(candidates[batch], order, axis=1)
+        similarities[batch] = np.take_along_axis(scores, order, axis=1)
+    return indices, similarities
@@ -0,0 +1,118 @@
+"""
+Cosine similarity queries over a whole set of embeddings at once, replacing the
+per-pair loops of the notebooks with matrix operations.
+
+The histograms all use fixed bins, so the counts of several blocks or of several
+embedding sets can be added up or compared bin by bin.
+"""
+
+import numpy as np
+import pandas as pd
+from search_utils import normalize
+
+
+class EmbeddingSet:
+    """
+    The keys of an embeddings file (words, movie titles, ...) and their vectors,
+    normalized once so every cosine similarity is a dot product.
+    """
+
+    def __init__(self, vectors, keys=None, dtype=np.float64):
+        if isinstance(vectors, dict):
+            keys = list(vectors.keys())
+            vectors = list(vectors.values())
+        self.keys = list(keys)
+        self.vectors = normalize(np.asarray(vectors, dtype=dtype)).astype(dtype, copy=False)
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def vector(self, key):
+        return self.vectors[self.rows[key]]
+
+    def similarities(self, key):
+        """
+        Return the cosine similarity of the key's vector to every vector in the set, in key order.
+        """
+        return self.vectors @ self.vector(key)
+
+    def similarity(self, key1, key2):
+        return float(self.vector(key1) @ self.vector(key2))
+
+    def most_similar(self, key, n=None, column="word"):
+        """
+        Return a DataFrame of the n most similar keys (all keys when n is None) and their
+        similarities, most similar first. The key itself is included, with similarity 1.
+        """
+        similarities = self.similarities(key)
+        order = np.argsort(-similarities, kind="stable")[:n]
+        return pd.DataFrame({column: [self.keys[row] for row in order], "similarity": similarities[order]})
+
+    def least_similar(self, key, n=None, column="word"):
+        """
+        Return a DataFrame of the n least similar keys and their similarities, least similar first.
+        """
+        similarities = self.similarities(key)
+        order = np.argsort(similarities, kind="stable")[:n]
+        return pd.DataFrame({column: [self.keys[row] for row in order], "similarity": similarities[order]})
+
+    def pairwise(self, keys=None):
+        """
+        Return the cosine similarity of every pair of the given keys (all keys by default) as a DataFrame.
+        """
+        keys = self.keys if keys is None else list(keys)
+        vectors = self.vectors[[self.rows[key] for key in keys]]
+        return pd.DataFrame(vectors @ vectors.T, index=keys, columns=keys)
+
+    def histogram(self, key, bins=20, range=(0, 1)):
+        """
+        Return the histogram (counts, bin_edges) of the similarities of the key to every other key.
+        """
+        similarities = np.delete(self.similarities(key), self.rows[key])
+        return np.histogram(similarities, bins=bins, range=range)
+
+    def pairs_histogram(self, bins=20, range=(0, 1), sample=None, seed=0, block_size=1024):
+        """
+        Return the histogram (counts, bin_edges) of the similarities between all pairs of distinct keys,
+        computed one block of rows at a time. With sample=n, the histogram of n random pairs instead.
+        """
+        edges = np.histogram_bin_edges([], bins=bins, range=range)
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        if sample is None:
+            for start in np.arange(0, len(self.vectors), block_size):
+                scores = self.vectors[start : start + block_size] @ self.vectors[start:].T
+                # Row i of the block is key start + i, only keep its pairs with the keys after it
+                upper = np.triu(np.ones(scores.shape, dtype=bool), k=1)
+                counts += np.histogram(scores[upper], bins=edges)[0]
+            return counts, edges
+
+        rng = np.random.default_rng(seed)
+        first = rng.integers(len(self.vectors), size=sample)
+        second = rng.integers(len(self.vectors) - 1, size=sample)
+        second += second >= first
+        for start in np.arange(0, sample, block_size):
+            batch = slice(start, start + block_size)
+            scores = np.einsum("ij,ij->i", self.vectors[first[batch]], self.vectors[second[batch]])
+            counts += np.histogram(scores, bins=edges)[0]
+        return counts, edges
+
+
+def compare_histograms(sets, key=None, bins=20, range=(0, 1), sample=None, density=False, seed=0):
+    """
+    Return a DataFrame with one column per embedding set ({name: EmbeddingSet}) and one row per bin,
+    holding the histogram of the key's similarities to the other keys, or of all pairs (sampled
+    with sample=n) when no key is given. With density=True each column holds fractions
+    of its similarities, which compares sets of different sizes.
+    """
+    columns = {}
+    for name, embedding_set in sets.items():
+        if key is None:
+            counts, edges = embedding_set.pairs_histogram(bins=bins, range=range, sample=sample, seed=seed)
+        else:
+            counts, edges = embedding_set.histogram(key, bins=bins, range=range)
+        columns[name] = counts / max(counts.sum(), 1) if density else counts
+    return pd.DataFrame(columns, index=pd.IntervalIndex.from_breaks(np.round(edges, 6), closed="left"))
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+from quantization import BinaryQuantizedIndex, ScalarQuantizedIndex
+from search_utils import exact_search
+
+
+@pytest.mark.parametrize("index_class", [ScalarQuantizedIndex, BinaryQuantizedIndex])
+def test_search_with_rescoring_returns_exact_similarities(index_class):
+    vectors = np.random.default_rng(0).standard_normal((500, 64)).astype(np.float32)
+    index = index_class(vectors, keep_originals=True)
+
+    indices, similarities = index.search(vectors[:5], 10, rescore=50)
+
+    assert indices.shape == similarities.shape == (5, 10)
+    assert (indices[:, 0] == np.arange(5)).all()
+    _, true_similarities = exact_search(vectors, vectors[:5], 10)
+    np.testing.assert_allclose(similarities[:, 0], true_similarities[:, 0], rtol=1e-5)
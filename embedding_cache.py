@@ -0,0 +1,118 @@
+"""
+Cache of query embeddings shared by the RAG scripts and the VectorEmbedding notebooks.
+
+They live in subfolders, so they put the repository root on sys.path before importing this module.
+"""
+
+import collections
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+
+def normalize_text(text):
+    """
+    Normalize a query so trivially different spellings of the same question share a cache entry:
+    unicode NFKC and runs of whitespace collapsed to one space. Case is kept, since embeddings
+    differ between casings ("US" and "us") and the API is called with the original text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Cache of query embeddings keyed by (model, dimensions, normalized text).
+
+    Lookups go to an in-memory LRU first, then to an optional SQLite file that
+    survives restarts, and only then to the embeddings API. Entries older than
+    `ttl` seconds are treated as missing in both tiers.
+    """
+
+    def __init__(self, client, max_entries=1024, ttl=7 * 24 * 3600, path=None):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = collections.OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # The cache is shared by the threads of hybrid_search, so every access goes through the lock
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self.db.commit()
+
+    def embed(self, text, model, dimensions=None):
+        """
+        Return the embedding of the text, calling the API only on a cache miss.
+        """
+        key = f"{model}\0{dimensions}\0{normalize_text(text)}"
+        now = time.time()
+        with self.lock:
+            embedding = self._get(key, now)
+            if embedding is not None:
+                return embedding
+            self.misses += 1
+
+        kwargs = {"dimensions": dimensions} if dimensions is not None else {}
+        embedding = self.client.embeddings.create(model=model, input=text, **kwargs).data[0].embedding
+
+        with self.lock:
+            self._put_memory(key, embedding, now)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding, created) VALUES (?, ?, ?)",
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes(), now),
+                )
+                self.db.commit()
+        return embedding
+
+    def _get(self, key, now):
+        entry = self.memory.get(key)
+        if entry is not None:
+            embedding, created = entry
+            if now - created <= self.ttl:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+            del self.memory[key]
+
+        if self.db is not None:
+            row = self.db.execute("SELECT embedding, created FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if now - row[1] <= self.ttl:
+                    embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._put_memory(key, embedding, row[1])
+                    self.disk_hits += 1
+                    return embedding
+                self.db.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self.db.commit()
+        return None
+
+    def _put_memory(self, key, embedding, created):
+        self.memory[key] = (embedding, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        """
+        Return the hit and miss counters, hits are split into memory and disk hits.
+        """
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self.memory),
+            }
@@ -0,0 +1,59 @@
+"""
+Helpers for index files saved next to the data they were built from, shared by the
+RAG indexes (HNSW, lunr) and the VectorEmbedding ones (HNSW, PCA projections).
+
+An index file such as rag_ingested_chunks.hnsw gets a JSON sidecar with its parameters
+and id mapping, rag_ingested_chunks.hnsw.json, and the sha256 of the source file tells
+whether a saved index is still up to date.
+
+They live in subfolders, so they put the repository root on sys.path before importing this module.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+
+
+def file_hash(path):
+    """
+    Return the sha256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def metadata_path(path):
+    """
+    Return the path of the JSON sidecar of an index file.
+    """
+    path = pathlib.Path(path)
+    return path.with_name(path.name + ".json")
+
+
+def write_json(path, data):
+    """
+    Write JSON to a temporary file first and move it in place, so a crash never leaves a half-written file behind.
+    """
+    path = pathlib.Path(path)
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+def save_metadata(path, metadata):
+    write_json(metadata_path(path), metadata)
+
+
+def load_metadata(path):
+    """
+    Return the sidecar of an index file, None when it has none.
+    """
+    if not metadata_path(path).exists():
+        return None
+    with open(metadata_path(path), encoding="utf-8") as f:
+        return json.load(f)
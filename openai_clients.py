@@ -0,0 +1,159 @@
+"""
+OpenAI clients shared by the Chat, RAG and Agent scripts.
+
+API_HOST selects the backend (azure, github, ollama or openai, github by default) and
+MODEL_NAME the chat model on it. The clients are created once per process and share one
+HTTP connection pool (one for sync, one for async requests), so connections and their
+TLS sessions are kept alive and reused instead of being set up again for every request.
+
+The pool is configured with environment variables:
+    OPENAI_MAX_CONNECTIONS             concurrent connections (default 20)
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS   idle connections kept open (default 10)
+    OPENAI_KEEPALIVE_EXPIRY            seconds an idle connection stays open (default 30)
+    OPENAI_TIMEOUT                     seconds to wait for a response (default 60)
+    OPENAI_CONNECT_TIMEOUT             seconds to wait for a connection (default 10)
+    OPENAI_MAX_RETRIES                 retries of failed requests (default 2)
+
+The scripts live in subfolders, so they put the repository root on sys.path before importing this module.
+"""
+
+import functools
+import os
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+API_HOST = os.getenv("API_HOST", "github")
+AZURE_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+def host_settings(api_host=API_HOST):
+    """
+    Return the base_url, API key and chat model of a backend, the Azure key is a token provider made by the clients.
+    """
+    if api_host == "azure":
+        return {
+            "base_url": f"{os.environ['AZURE_OPENAI_ENDPOINT']}/openai/v1/",
+            "api_key": None,
+            "model": os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"],
+        }
+    if api_host == "github":
+        return {
+            "base_url": "https://models.github.ai/inference",
+            "api_key": os.environ["GITHUB_TOKEN"],
+            "model": os.getenv("GITHUB_MODEL", "openai/gpt-4o"),
+        }
+    if api_host == "ollama":
+        return {
+            "base_url": os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434/v1"),
+            "api_key": "none",
+            "model": os.getenv("OLLAMA_MODEL", "llama3.1:latest"),
+        }
+    return {"base_url": None, "api_key": os.environ["OPENAI_API_KEY"], "model": os.getenv("OPENAI_MODEL", "gpt-4o")}
+
+
+MODEL_NAME = host_settings()["model"]
+
+
+def connection_limits():
+    return httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def timeout():
+    return httpx.Timeout(
+        float(os.getenv("OPENAI_TIMEOUT", "60")), connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+    )
+
+
+@functools.cache
+def get_http_client():
+    return openai.DefaultHttpxClient(limits=connection_limits(), timeout=timeout())
+
+
+@functools.cache
+def get_async_http_client():
+    return openai.DefaultAsyncHttpxClient(limits=connection_limits(), timeout=timeout())
+
+
+@functools.cache
+def _azure_credential():
+    import azure.identity
+
+    return azure.identity.DefaultAzureCredential()
+
+
+@functools.cache
+def _azure_async_credential():
+    import azure.identity.aio
+
+    return azure.identity.aio.DefaultAzureCredential()
+
+
+@functools.cache
+def get_client():
+    """
+    Return the process-wide openai.OpenAI client for API_HOST.
+    """
+    settings = host_settings()
+    api_key = settings["api_key"]
+    if API_HOST == "azure":
+        import azure.identity
+
+        api_key = azure.identity.get_bearer_token_provider(_azure_credential(), AZURE_SCOPE)
+    return openai.OpenAI(
+        base_url=settings["base_url"],
+        api_key=api_key,
+        http_client=get_http_client(),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    )
+
+
+@functools.cache
+def get_async_client():
+    """
+    Return the process-wide openai.AsyncOpenAI client for API_HOST. Its connections belong to
+    the event loop that opened them, so use it from a single asyncio.run().
+    """
+    settings = host_settings()
+    api_key = settings["api_key"]
+    if API_HOST == "azure":
+        import azure.identity.aio
+
+        api_key = azure.identity.aio.get_bearer_token_provider(_azure_async_credential(), AZURE_SCOPE)
+    return openai.AsyncOpenAI(
+        base_url=settings["base_url"],
+        api_key=api_key,
+        http_client=get_async_http_client(),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    )
+
+
+@functools.cache
+def get_chat_client():
+    """
+    Return an agent_framework OpenAIChatClient for MODEL_NAME that sends its requests through the shared async client.
+    """
+    from agent_framework.openai import OpenAIChatClient
+
+    return OpenAIChatClient(async_client=get_async_client(), model_id=MODEL_NAME)
+
+
+async def close_async_clients():
+    """
+    Close the async connection pool and, on Azure, the async credential. Call it before the event loop ends.
+    """
+    if get_async_client.cache_info().currsize:
+        await get_async_client().close()
+        get_async_client.cache_clear()
+    if _azure_async_credential.cache_info().currsize:
+        await _azure_async_credential().close()
+        _azure_async_credential.cache_clear()
+    get_chat_client.cache_clear()
+    get_async_http_client.cache_clear()
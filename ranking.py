@@ -0,0 +1,26 @@
+"""
+Top-k selection shared by the RAG indexes and the VectorEmbedding search modules.
+
+They live in subfolders, so they put the repository root on sys.path before importing this module.
+"""
+
+import numpy as np
+
+
+def top_k(scores, k):
+    """
+    Return the column indices of the k highest scores of each row, best first, as a (rows, k) array.
+    A 1-D array of scores is one row. Uses a partial selection instead of sorting every score,
+    and selected ties keep their original order like a stable sort would.
+    """
+    scores = np.atleast_2d(scores)
+    k = max(min(k, scores.shape[1]), 0)
+    if k == 0:
+        return np.empty((len(scores), 0), dtype=np.intp)
+    if k < scores.shape[1]:
+        # argpartition leaves the selected columns in no particular order, sort them so ties stay in position order
+        candidates = np.sort(np.argpartition(-scores, k - 1, axis=1)[:, :k], axis=1)
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)